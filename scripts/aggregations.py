@@ -0,0 +1,134 @@
+"""
+Shared Aggregation Engine
+One grouped pass per filter state, reused by every chart, KPI and insight
+"""
+
+import numpy as np
+import pandas as pd
+from instrumentation import traced
+
+# Finest grouping computed in the single pass; every dashboard breakdown is
+# a roll-up of these cells
+CELL_DIMENSIONS = ['year', 'month', 'product', 'region', 'salesperson']
+MEASURES = ['total_sales', 'quantity', 'row_count']
+
+# Above this many possible cells, fall back from a dense bincount to a sort
+MAX_DENSE_CELLS = 10_000_000
+
+class SalesAggregates:
+    """Group sums, counts and means for one filtered dataset
+
+    Built from per-cell totals (year x month x product x region x
+    salesperson), so each breakdown costs O(cells) rather than O(rows) and
+    is computed at most once.
+    """
+
+    def __init__(self, cells):
+        self.cells = cells
+        self._groups = {}
+        self._views = {}
+
+    @property
+    def kpis(self):
+        """Return total revenue, transactions, average order value and quantity"""
+        total_revenue = float(self.cells['total_sales'].sum())
+        total_transactions = int(self.cells['row_count'].sum())
+        return {
+            'total_revenue': total_revenue,
+            'total_transactions': total_transactions,
+            'avg_order_value': total_revenue / total_transactions if total_transactions else float('nan'),
+            'total_quantity': int(self.cells['quantity'].sum()),
+        }
+
+    def group(self, dimension):
+        """Return total_sales, quantity, row_count and mean order value per dimension value"""
+        if dimension not in self._groups:
+            codes, uniques = pd.factorize(self.cells[dimension], sort=True)
+            sums = {
+                measure: np.bincount(codes, weights=self.cells[measure].to_numpy(), minlength=len(uniques))
+                for measure in MEASURES
+            }
+            grouped = pd.DataFrame({
+                dimension: np.asarray(uniques),
+                'total_sales': sums['total_sales'],
+                'quantity': sums['quantity'].astype('int64'),
+                'row_count': sums['row_count'].astype('int64'),
+                'avg_order_value': sums['total_sales'] / sums['row_count'],
+            })
+            self._groups[dimension] = grouped
+        return self._groups[dimension]
+
+    def sales_by(self, dimension, order='key', limit=None):
+        """Return a [dimension, total_sales] frame ordered by key or by sales"""
+        key = ('frame', dimension, order, limit)
+        if key not in self._views:
+            data = self.group(dimension)[[dimension, 'total_sales']]
+            if order == 'desc':
+                data = data.sort_values('total_sales', ascending=False)
+            if limit is not None:
+                data = data.head(limit)
+            self._views[key] = data.reset_index(drop=True)
+        return self._views[key]
+
+    def series(self, dimension, order='key'):
+        """Return total_sales per dimension value as a Series"""
+        key = ('series', dimension, order)
+        if key not in self._views:
+            self._views[key] = self.sales_by(dimension, order).set_index(dimension)['total_sales']
+        return self._views[key]
+
+@traced()
+def compute_aggregates(df):
+    """Aggregate a filtered frame into SalesAggregates in a single pass
+
+    Each dimension is factorized to integer codes, the codes are combined
+    into one cell id, and the measures are summed with np.bincount.
+    """
+    codes = []
+    uniques = []
+    for dimension in CELL_DIMENSIONS:
+        dimension_codes, dimension_uniques = pd.factorize(df[dimension], sort=True)
+        codes.append(dimension_codes)
+        uniques.append(np.asarray(dimension_uniques))
+
+    sizes = [max(len(u), 1) for u in uniques]
+    cell_ids = np.zeros(len(df), dtype=np.int64)
+    for dimension_codes, size in zip(codes, sizes):
+        cell_ids = cell_ids * size + dimension_codes
+
+    n_cells = int(np.prod(sizes, dtype=np.int64))
+    if n_cells <= MAX_DENSE_CELLS:
+        row_count = np.bincount(cell_ids, minlength=n_cells)
+        occupied = np.flatnonzero(row_count)
+        sums = {
+            'total_sales': np.bincount(cell_ids, weights=df['total_sales'], minlength=n_cells)[occupied],
+            'quantity': np.bincount(cell_ids, weights=df['quantity'], minlength=n_cells)[occupied],
+        }
+        row_count = row_count[occupied]
+    else:
+        occupied, inverse = np.unique(cell_ids, return_inverse=True)
+        row_count = np.bincount(inverse)
+        sums = {
+            'total_sales': np.bincount(inverse, weights=df['total_sales']),
+            'quantity': np.bincount(inverse, weights=df['quantity']),
+        }
+
+    return decode_cells(occupied, uniques, sizes, sums['total_sales'], sums['quantity'], row_count)
+
+def decode_cells(occupied, uniques, sizes, total_sales, quantity, row_count):
+    """Decode occupied cell ids and their totals into SalesAggregates"""
+    cells = {}
+    remainder = occupied
+    for dimension, dimension_uniques, size in reversed(list(zip(CELL_DIMENSIONS, uniques, sizes))):
+        remainder, dimension_codes = np.divmod(remainder, size)
+        cells[dimension] = dimension_uniques[dimension_codes] if len(dimension_uniques) else dimension_codes
+
+    cells = pd.DataFrame({dimension: cells[dimension] for dimension in CELL_DIMENSIONS})
+    cells['total_sales'] = total_sales
+    cells['quantity'] = np.asarray(quantity).astype('int64')
+    cells['row_count'] = np.asarray(row_count).astype('int64')
+    return SalesAggregates(cells)
+
+def aggregates_from_cells(cells):
+    """Wrap pre-aggregated cells (e.g. from SQL) in SalesAggregates"""
+    return SalesAggregates(pd.DataFrame(cells, columns=CELL_DIMENSIONS + MEASURES))
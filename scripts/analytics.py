@@ -0,0 +1,113 @@
+"""
+Headless Analytics
+Typed KPI and insight results, independent of Streamlit
+"""
+
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional, Union
+import pandas as pd
+from instrumentation import traced
+from query_backend import DataFrameBackend, SQLiteBackend
+from storage import compact_frame, read_sales
+
+DATABASE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+
+@dataclass(frozen=True)
+class KPIs:
+    """Headline totals for a filtered dataset"""
+    total_revenue: float
+    total_transactions: int
+    avg_order_value: float
+    total_quantity: int
+
+@dataclass(frozen=True)
+class Leader:
+    """A dimension value and its total sales"""
+    name: Union[str, int]
+    total_sales: float
+
+@dataclass(frozen=True)
+class Growth:
+    """Revenue change between two years, in percent"""
+    from_year: int
+    to_year: int
+    growth_pct: float
+
+@dataclass(frozen=True)
+class SalesInsights:
+    """KPIs plus the leaders and growth figures shown as insights"""
+    kpis: KPIs
+    top_product: Optional[Leader]
+    top_region: Optional[Leader]
+    yoy_growth: Optional[Growth]
+    peak_month: Optional[Leader]
+    top_performers: List[Leader] = field(default_factory=list)
+
+    def to_dict(self):
+        """Return the insights as plain JSON-serializable types"""
+        return asdict(self)
+
+def native(value):
+    """Convert numpy scalars to Python ones"""
+    return value.item() if hasattr(value, 'item') else value
+
+def compute_kpis(aggs):
+    """Return the KPIs of a SalesAggregates"""
+    kpis = aggs.kpis
+    return KPIs(
+        total_revenue=float(kpis['total_revenue']),
+        total_transactions=int(kpis['total_transactions']),
+        avg_order_value=float(kpis['avg_order_value']),
+        total_quantity=int(kpis['total_quantity']),
+    )
+
+def ranked(aggs, dimension, limit=None, top=None):
+    """Return dimension values ordered by total sales, highest first
+
+    top(dimension, limit), when given, is tried first (e.g. a backend's
+    top-K index); a None result falls back to the aggregates.
+    """
+    data = top(dimension, limit) if top is not None and limit is not None else None
+    if data is None:
+        data = aggs.sales_by(dimension, order='desc', limit=limit)
+    return [Leader(native(name), float(total)) for name, total in zip(data[dimension], data['total_sales'])]
+
+def year_over_year(aggs):
+    """Return the growth from the first to the second year, or None"""
+    yearly = aggs.series('year')
+    if len(yearly) < 2:
+        return None
+    first, second = sorted(yearly.index)[:2]
+    return Growth(native(first), native(second), float((yearly[second] - yearly[first]) / yearly[first] * 100))
+
+@traced()
+def compute_insights(aggs, n_performers=10, top=None):
+    """Return KPIs, top product/region, YoY growth, peak month and top performers"""
+    products = ranked(aggs, 'product', limit=1, top=top)
+    regions = ranked(aggs, 'region', limit=1, top=top)
+    months = ranked(aggs, 'month', limit=1)
+    return SalesInsights(
+        kpis=compute_kpis(aggs),
+        top_product=products[0] if products else None,
+        top_region=regions[0] if regions else None,
+        yoy_growth=year_over_year(aggs),
+        peak_month=months[0] if months else None,
+        top_performers=ranked(aggs, 'salesperson', limit=n_performers, top=top),
+    )
+
+def open_backend(source):
+    """Return a query backend for a DataFrame, a SQLite database or a CSV/Parquet path"""
+    if isinstance(source, pd.DataFrame):
+        return DataFrameBackend(source)
+    if hasattr(source, 'aggregates'):
+        return source
+    if str(source).endswith(DATABASE_SUFFIXES):
+        return SQLiteBackend(source)
+    return DataFrameBackend(compact_frame(read_sales(source)))
+
+def analyze(source, filters=None, n_performers=10):
+    """Compute SalesInsights for a data source under the dashboard filters"""
+    backend = open_backend(source)
+    filters = filters or {}
+    aggs = backend.aggregates(filters)
+    return compute_insights(aggs, n_performers, top=lambda dimension, k: backend.top(dimension, filters, k))
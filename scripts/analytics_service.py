@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Analytics Service
+Asyncio HTTP/JSON API over the dashboard's filter and aggregation queries
+
+Endpoints (all GET; filters as query parameters products, regions, years as
+comma-separated lists and start/end as YYYY-MM-DD):
+    /health                       liveness check
+    /filters                      values offered by the dashboard filters
+    /kpis                         total revenue, transactions, AOV, quantity
+    /insights                     KPIs, leaders, YoY growth, top performers
+    /breakdown/<dimension>        total_sales by month/product/region/year/salesperson
+    /trends?granularity=month     day/week/month/quarter revenue series
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+import numpy as np
+import pandas as pd
+from analytics import compute_insights
+from filter_index import FilterIndex
+from query_backend import DIMENSIONS, DataFrameBackend, SQLiteBackend, date_bounds, filter_key
+from result_cache import ResultCache, data_version
+from storage import compact_frame, read_sales
+from topk_index import TopKIndex
+from trends import GRANULARITIES, TrendRollups
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_POOL_SIZE = 8
+DEFAULT_DATABASE = 'data/sales.db'
+DEFAULT_CLEAN_DATA = 'data/clean_sales_data.csv'
+
+# How often the data version (file mtimes) is re-checked
+VERSION_CHECK_SECONDS = 1.0
+
+MAX_REQUEST_LINE = 8192
+# Request bodies are never used; ones up to this size are read and dropped
+# to keep the connection alive, larger or chunked ones close it
+MAX_DISCARDED_BODY = 64 * 1024
+LIST_SEPARATOR = ','
+
+class HTTPError(Exception):
+    """An error response with a status code"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+def parse_filters(params):
+    """Convert query parameters into the dashboard's filter dict"""
+    filters = {}
+    for key in ('products', 'regions', 'years'):
+        if key in params:
+            values = [v for v in params[key][-1].split(LIST_SEPARATOR) if v]
+            if key == 'years':
+                try:
+                    values = [int(v) for v in values]
+                except ValueError:
+                    raise HTTPError(HTTPStatus.BAD_REQUEST, f"years must be integers: {params[key][-1]}")
+            filters[key] = values
+    if 'start' in params or 'end' in params:
+        try:
+            start = pd.Timestamp(params.get('start', ['1900-01-01'])[-1])
+            end = pd.Timestamp(params.get('end', ['2999-12-31'])[-1])
+        except ValueError as error:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"invalid date: {error}")
+        if pd.isna(start) or pd.isna(end):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "invalid date: start and end must be dates")
+        if start > end:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"start {start.date()} is after end {end.date()}")
+        filters['date_range'] = (start.date(), end.date())
+    return filters
+
+def to_json_value(value):
+    """JSON fallback for numpy scalars and timestamps"""
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+def finite_or_none(value):
+    """Replace NaN and infinite floats in a JSON-ready structure with None
+
+    Empty selections give NaN averages and growth rates, which are not
+    valid JSON; they are served as null.
+    """
+    if isinstance(value, (float, np.floating)):
+        return float(value) if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: finite_or_none(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [finite_or_none(item) for item in value]
+    return value
+
+def frame_records(df):
+    """Return a DataFrame as a list of JSON-ready row dicts"""
+    return df.to_dict(orient='records')
+
+class SQLitePool:
+    """Fixed-size pool of read-only SQLite backends, one connection each"""
+
+    def __init__(self, database_path, size):
+        self.backends = asyncio.Queue()
+        self.closed = False
+        for _ in range(size):
+            self.backends.put_nowait(SQLiteBackend(database_path))
+
+    async def run(self, loop, executor, func):
+        """Run func(backend) on a pooled backend in the executor"""
+        backend = await self.backends.get()
+        try:
+            return await loop.run_in_executor(executor, func, backend)
+        finally:
+            # A pool replaced while the query ran closes its backends as they return
+            if self.closed:
+                backend.close()
+            else:
+                self.backends.put_nowait(backend)
+
+    def close(self):
+        """Close the idle pooled connections; busy ones close when returned"""
+        self.closed = True
+        while not self.backends.empty():
+            self.backends.get_nowait().close()
+
+class FramePool:
+    """In-memory source; each request gets its own backend over a shared index"""
+
+    def __init__(self, path):
+        self.path = path
+        self.index = FilterIndex(compact_frame(read_sales(path)))
+        self.topk = TopKIndex(self.index.df)
+
+    async def run(self, loop, executor, func):
+        """Run func(backend) in the executor on a fresh backend"""
+        return await loop.run_in_executor(
+            executor, lambda: func(DataFrameBackend(self.index.df, self.index, self.topk))
+        )
+
+    def close(self):
+        """Nothing to release; the index is freed with the pool"""
+
+class AnalyticsService:
+    """Routes requests to cached, pooled queries and serves JSON with ETags"""
+
+    def __init__(self, source, pool_size=DEFAULT_POOL_SIZE, workers=None):
+        self.source = source
+        self.pool_size = pool_size
+        self.executor = ThreadPoolExecutor(max_workers=workers or pool_size)
+        self.cache = ResultCache()
+        self.pool = None
+        self.version = None
+        self.version_checked = 0.0
+        self.reload_lock = asyncio.Lock()
+
+    def is_database(self):
+        """Return True if the source is a SQLite database"""
+        return self.source.endswith(('.db', '.sqlite', '.sqlite3'))
+
+    async def current_version(self):
+        """Return the data version, reopening the source when it changed"""
+        now = time.monotonic()
+        if self.pool is not None and now - self.version_checked < VERSION_CHECK_SECONDS:
+            return self.version
+
+        loop = asyncio.get_running_loop()
+        version = await loop.run_in_executor(self.executor, data_version, self.source)
+        async with self.reload_lock:
+            if self.pool is None or version != self.version:
+                if self.pool is not None:
+                    self.pool.close()
+                if self.is_database():
+                    self.pool = SQLitePool(self.source, self.pool_size)
+                else:
+                    self.pool = await loop.run_in_executor(self.executor, FramePool, self.source)
+                self.cache.sync_version(self.source, version)
+                self.version = version
+            self.version_checked = now
+        return self.version
+
+    async def query(self, key, func):
+        """Return func(backend) through the result cache and the connection pool"""
+        cached = self.cache.peek(key)
+        if cached is not None:
+            return cached
+        loop = asyncio.get_running_loop()
+        return await self.pool.run(loop, self.executor, lambda backend: self.cache.get(key, lambda: func(backend)))
+
+    async def handle(self, path, params):
+        """Return the JSON-ready body for a request path"""
+        filters = parse_filters(params)
+        version = await self.current_version()
+        base_key = (self.source, version, filter_key(filters))
+
+        if path == '/filters':
+            options = await self.query(base_key + ('filters',), lambda backend: backend.filter_options())
+            return {key: value if isinstance(value, list) else value.isoformat() for key, value in options.items()}
+
+        if path in ('/kpis', '/insights'):
+            insights = await self.query(
+                base_key + ('insights',), lambda backend: compute_insights(
+                    backend.aggregates(filters), top=lambda dimension, k: backend.top(dimension, filters, k)
+                )
+            )
+            return insights.to_dict()['kpis'] if path == '/kpis' else insights.to_dict()
+
+        if path.startswith('/breakdown/'):
+            dimension = path[len('/breakdown/'):]
+            if dimension not in DIMENSIONS:
+                raise HTTPError(HTTPStatus.NOT_FOUND, f"Unknown dimension: {dimension}")
+            order = params.get('order', ['key'])[-1]
+            limit = params.get('limit', [None])[-1]
+            if limit:
+                try:
+                    limit = int(limit)
+                except ValueError:
+                    limit = 0
+                if limit < 1:
+                    raise HTTPError(HTTPStatus.BAD_REQUEST, f"limit must be a positive integer: {params['limit'][-1]}")
+            else:
+                limit = None
+            if order == 'desc' and limit:
+                # Leaderboards over whole months come from the top-K index
+                top = await self.query(base_key + ('top', dimension, limit),
+                                       lambda backend: backend.top(dimension, filters, limit))
+                if top is not None:
+                    return frame_records(top)
+            aggs = await self.query(base_key + ('aggregates',), lambda backend: backend.aggregates(filters))
+            return frame_records(aggs.sales_by(dimension, order='desc' if order == 'desc' else 'key', limit=limit))
+
+        if path == '/trends':
+            granularity = params.get('granularity', ['month'])[-1]
+            if granularity not in GRANULARITIES:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, f"Unknown granularity: {granularity}")
+            trend_filters = dict(filters, date_range=())
+            trends = await self.query(
+                (self.source, version, filter_key(trend_filters), 'trends'),
+                lambda backend: TrendRollups(backend.daily_totals(trend_filters))
+            )
+            bounds = date_bounds(filters) or (None, None)
+            return frame_records(trends.series(granularity, *bounds))
+
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"Unknown endpoint: {path}")
+
+    async def etag(self, path, params):
+        """Return the ETag of a response: the data version plus the normalized request"""
+        version = await self.current_version()
+        filters = parse_filters(params)
+        extra = sorted((k, v[-1]) for k, v in params.items() if k not in ('products', 'regions', 'years', 'start', 'end'))
+        digest = hashlib.sha1(repr((version, path, filter_key(filters), extra)).encode()).hexdigest()
+        return f'"{digest}"'
+
+    async def respond(self, method, target, headers):
+        """Return (status, extra headers, body bytes) for one request"""
+        if method not in ('GET', 'HEAD'):
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"Method not allowed: {method}")
+        url = urlsplit(target)
+        path = unquote(url.path).rstrip('/') or '/'
+        params = parse_qs(url.query)
+
+        if path == '/health':
+            return HTTPStatus.OK, {}, b'{"status": "ok"}'
+
+        etag = await self.etag(path, params)
+        if headers.get('if-none-match') == etag:
+            return HTTPStatus.NOT_MODIFIED, {'ETag': etag}, b''
+
+        body = await self.handle(path, params)
+        payload = json.dumps(finite_or_none(body), default=to_json_value, allow_nan=False).encode()
+        return HTTPStatus.OK, {'ETag': etag, 'Cache-Control': 'no-cache'}, payload
+
+    async def serve_connection(self, reader, writer):
+        """Serve HTTP/1.1 requests on one connection until it closes"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                if len(request_line) > MAX_REQUEST_LINE:
+                    await self.write(writer, HTTPStatus.REQUEST_URI_TOO_LONG, {}, b'', keep_alive=False)
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self.write(writer, HTTPStatus.BAD_REQUEST, {}, b'', keep_alive=False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+
+                # Skip any request body so the next request line is read from
+                # the start; bodies that cannot be skipped end the connection
+                content_length = headers.get('content-length', '0')
+                if ('transfer-encoding' in headers or not content_length.isdigit()
+                        or int(content_length) > MAX_DISCARDED_BODY):
+                    keep_alive = False
+                elif int(content_length):
+                    await reader.readexactly(int(content_length))
+
+                try:
+                    status, extra, body = await self.respond(method, target, headers)
+                except HTTPError as error:
+                    status, extra = error.status, {}
+                    body = json.dumps({'error': error.message}).encode()
+                except Exception as error:
+                    status, extra = HTTPStatus.INTERNAL_SERVER_ERROR, {}
+                    body = json.dumps({'error': f"{type(error).__name__}: {error}"}).encode()
+
+                await self.write(writer, status, extra, b'' if method == 'HEAD' else body, keep_alive, len(body))
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def write(writer, status, headers, body, keep_alive=True, content_length=None):
+        """Write one HTTP response"""
+        lines = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Date: {formatdate(usegmt=True)}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body) if content_length is None else content_length}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+async def serve(source, host=DEFAULT_HOST, port=DEFAULT_PORT, pool_size=DEFAULT_POOL_SIZE, workers=None):
+    """Start the service and run until cancelled"""
+    service = AnalyticsService(source, pool_size, workers)
+    await service.current_version()
+    server = await asyncio.start_server(service.serve_connection, host, port, backlog=1024)
+    print(f"📡 Serving {source} on http://{host}:{port} ({pool_size} pooled connections)")
+    async with server:
+        await server.serve_forever()
+
+def default_source():
+    """Prefer the SQLite database, then the column store or Parquet dataset, then the CSV"""
+    for path in (DEFAULT_DATABASE, 'data/clean_sales_data.columns', 'data/clean_sales_data.parquet'):
+        if os.path.exists(path):
+            return path
+    return DEFAULT_CLEAN_DATA
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Serve sales analytics as JSON over HTTP')
+    parser.add_argument('--source', default=None,
+                        help='SQLite database, column store, Parquet dataset or CSV file (default: data/sales.db if present)')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='Interface to bind')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on')
+    parser.add_argument('--pool-size', type=int, default=DEFAULT_POOL_SIZE,
+                        help='Pooled read-only SQLite connections')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker threads for queries and aggregation (default: pool size)')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    try:
+        asyncio.run(serve(args.source or default_source(), args.host, args.port, args.pool_size, args.workers))
+    except KeyboardInterrupt:
+        print("\n👋 Service stopped")
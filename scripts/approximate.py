@@ -0,0 +1,276 @@
+"""
+Approximate Queries
+Stratified samples and order-value sketches for instant KPIs with error bounds
+"""
+
+import numpy as np
+import pandas as pd
+from aggregations import CELL_DIMENSIONS, SalesAggregates
+from filter_index import FilterIndex
+from instrumentation import traced
+from query_backend import FILTER_COLUMNS, SAMPLE_SEED, active_values, date_bounds, index_selections
+from storage import compact_frame
+
+# Rows are sampled independently within each year x month x product x region
+STRATA = ['year', 'month', 'product', 'region']
+
+DEFAULT_SAMPLE_ROWS = 100_000
+
+# Columns read by the first (stratum sizes) and second (sample) passes
+SURVEY_COLUMNS = STRATA + ['total_sales']
+SAMPLE_COLUMNS = ['date'] + CELL_DIMENSIONS + ['total_sales', 'quantity']
+
+# Rows per chunk when an in-memory frame is walked like a chunked source
+CHUNK_ROWS = 1_000_000
+
+# Every stratum samples at least this many rows in expectation (or all of
+# them), so small strata still get a usable variance estimate
+MIN_STRATUM_ROWS = 30
+
+# Two-sided 95% normal quantile for the error bounds
+Z_95 = 1.96
+
+# Order-value sketch buckets are (1 + RELATIVE_ACCURACY)^2 / (1 - ...) wide
+# in log space, so every reported quantile is within 1% of a true order value
+RELATIVE_ACCURACY = 0.01
+
+ORDER_VALUE_QUANTILES = (0.5, 0.9, 0.99)
+
+KPI_MEASURES = {
+    'total_revenue': 'total_sales',
+    'total_transactions': 'row_count',
+    'total_quantity': 'quantity',
+}
+
+class ApproximateAggregates(SalesAggregates):
+    """SalesAggregates estimated from a stratified sample, with 95% margins
+
+    Cell totals are the sampled rows scaled by their stratum weight (so
+    counts stay fractional until the KPIs round them), and every chart and
+    insight built on SalesAggregates works unchanged;
+    kpi_margins and the 'margin' column of sales_by give the error bounds.
+    """
+
+    def __init__(self, cells, sample, estimator):
+        super().__init__(cells)
+        self.sample = sample
+        self.estimator = estimator
+        self.sample_rows = len(sample)
+
+    @property
+    def kpis(self):
+        """Return the estimated KPIs, with counts rounded to whole rows and units"""
+        kpis = super().kpis
+        kpis['total_transactions'] = int(round(float(self.cells['row_count'].sum())))
+        kpis['total_quantity'] = int(round(float(self.cells['quantity'].sum())))
+        return kpis
+
+    @property
+    def kpi_margins(self):
+        """Return the 95% margin of each KPI"""
+        if 'kpi_margins' not in self._views:
+            kpis = self.kpis
+            margins = {
+                name: self.estimator.margin(self.sample, self.sample[measure])
+                for name, measure in KPI_MEASURES.items()
+            }
+            # Ratio estimator: linearize the average order value around its estimate
+            residuals = self.sample['total_sales'] - kpis['avg_order_value']
+            margins['avg_order_value'] = (
+                self.estimator.margin(self.sample, residuals) / kpis['total_transactions']
+                if kpis['total_transactions'] else float('nan')
+            )
+            self._views['kpi_margins'] = margins
+        return self._views['kpi_margins']
+
+    def sales_by(self, dimension, order='key', limit=None):
+        """Return a [dimension, total_sales, margin] frame ordered by key or by sales"""
+        key = ('margin', dimension, order, limit)
+        if key not in self._views:
+            data = super().sales_by(dimension, order, limit).copy()
+            margins = self.estimator.group_margins(self.sample, dimension, 'total_sales')
+            data['margin'] = data[dimension].map(margins).fillna(0.0).to_numpy()
+            self._views[key] = data
+        return self._views[key]
+
+class ApproximateIndex:
+    """Stratified sample and order-value sketch over the full data
+
+    The sample keeps about sample_rows rows, allocated to strata in
+    proportion to their size, and is filtered with its own FilterIndex, so
+    a filter change costs O(sample) instead of O(rows). The sketch keeps
+    log-spaced order-value bucket counts per stratum; filters select whole
+    strata, so date ranges are resolved to calendar months.
+
+    data is a DataFrame, or a callable data(columns) returning an iterable
+    of DataFrame chunks with those columns. It is read twice, one chunk at
+    a time: a first pass over the strata and order values counts stratum
+    sizes, and a second draws the sample and fills the sketch, so only the
+    sample is ever held in memory.
+    """
+
+    def __init__(self, data, sample_rows=DEFAULT_SAMPLE_ROWS, seed=SAMPLE_SEED):
+        if isinstance(data, pd.DataFrame):
+            frame = data
+            data = lambda columns: (frame[columns].iloc[start:start + CHUNK_ROWS]
+                                    for start in range(0, len(frame), CHUNK_ROWS))
+        self.survey(data(SURVEY_COLUMNS))
+        self.build(data(SAMPLE_COLUMNS), sample_rows, seed)
+
+    def survey(self, chunks):
+        """First pass: count rows per stratum and find the order-value bucket range"""
+        counts = {}
+        low = high = None
+        for chunk in chunks:
+            for key, size in chunk.groupby(STRATA, observed=True).size().items():
+                counts[key] = counts.get(key, 0) + size
+            values = chunk['total_sales'].to_numpy(dtype=np.float64)
+            values = values[values > 0]
+            if len(values):
+                low = values.min() if low is None else min(low, values.min())
+                high = values.max() if high is None else max(high, values.max())
+        keys = pd.DataFrame(list(counts), columns=STRATA)
+        self.uniques = {column: np.asarray(sorted(set(keys[column]))) for column in STRATA}
+        self.sizes = [max(len(self.uniques[column]), 1) for column in STRATA]
+        self.n_strata = int(np.prod(self.sizes, dtype=np.int64))
+        strata = self.stratum_ids(keys)
+        sizes = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        self.population = np.bincount(strata, weights=sizes, minlength=self.n_strata).astype(np.int64)
+        self.n_rows = int(self.population.sum())
+
+        # Decode each stratum id to its labels for sketch filtering
+        self.labels = {}
+        remainder = np.arange(self.n_strata)
+        for column, size in reversed(list(zip(STRATA, self.sizes))):
+            remainder, column_codes = np.divmod(remainder, size)
+            uniques = self.uniques[column]
+            self.labels[column] = uniques[column_codes] if len(uniques) else column_codes
+
+        # Non-positive order values share the lowest sketch bucket
+        self.gamma = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+        self.bucket_offset = int(self.buckets(np.array([low]))[0]) - 1 if low is not None else 0
+        self.n_buckets = int(self.buckets(np.array([high]))[0]) - self.bucket_offset + 1 if high is not None else 1
+
+    def stratum_ids(self, frame):
+        """Return the stratum id of every row of frame"""
+        stratum = np.zeros(len(frame), dtype=np.int64)
+        for column, size in zip(STRATA, self.sizes):
+            labels = pd.Index(self.uniques[column])
+            series = frame[column]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                # Map the categories once instead of every row
+                codes = labels.get_indexer(series.cat.categories)[series.cat.codes.to_numpy()]
+            else:
+                codes = labels.get_indexer(series.to_numpy())
+            stratum = stratum * size + codes
+        return stratum
+
+    def buckets(self, values):
+        """Return the log-spaced sketch bucket of each positive order value"""
+        return np.ceil(np.log(values) / np.log(self.gamma)).astype(np.int64)
+
+    def build(self, chunks, sample_rows, seed):
+        """Second pass: draw a Bernoulli sample within each stratum and fill the sketch
+
+        Each row is kept with its stratum's sampling rate, so no sort is
+        needed; weights use the realized per-stratum sample counts.
+        """
+        share = self.population * min(1.0, sample_rows / max(self.n_rows, 1))
+        target = np.minimum(self.population, np.maximum(share, MIN_STRATUM_ROWS))
+        rate = target / np.maximum(self.population, 1)
+        rng = np.random.default_rng(seed)
+
+        pieces = []
+        self.sketch = np.zeros((self.n_strata, self.n_buckets), dtype=np.int64)
+        for chunk in chunks:
+            stratum = self.stratum_ids(chunk)
+            kept = np.flatnonzero(rng.random(len(chunk)) < rate[stratum])
+            piece = chunk.iloc[kept].reset_index(drop=True)
+            piece['stratum'] = stratum[kept]
+            pieces.append(piece)
+
+            values = chunk['total_sales'].to_numpy(dtype=np.float64)
+            positive = values > 0
+            buckets = np.zeros(len(values), dtype=np.int64)
+            buckets[positive] = self.buckets(values[positive]) - self.bucket_offset
+            self.sketch += np.bincount(stratum * self.n_buckets + buckets,
+                                       minlength=self.n_strata * self.n_buckets).reshape(self.sketch.shape)
+
+        if pieces:
+            # Chunks may carry different categories, so re-compact the union
+            sample = compact_frame(pd.concat(pieces, ignore_index=True))
+        else:
+            sample = pd.DataFrame({column: [] for column in SAMPLE_COLUMNS + ['stratum']})
+        strata = sample['stratum'].to_numpy(dtype=np.int64)
+        self.sample_sizes = np.bincount(strata, minlength=self.n_strata)
+        sample['weight'] = (self.population / np.maximum(self.sample_sizes, 1))[strata]
+        sample['row_count'] = 1
+        self.index = FilterIndex(sample)
+
+    def margin(self, sample, values):
+        """Return the 95% margin of the estimated total of values over sample
+
+        sample holds the sampled rows that pass the filter; rows of the same
+        strata that fail it count as zeros in the stratified variance.
+        """
+        strata = sample['stratum'].to_numpy()
+        values = np.asarray(values, dtype=np.float64)
+        sums = np.bincount(strata, weights=values, minlength=self.n_strata)
+        squares = np.bincount(strata, weights=values * values, minlength=self.n_strata)
+        n = self.sample_sizes.astype(np.float64)
+        big_n = self.population.astype(np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = (squares - sums * sums / n) / (n - 1)
+            stratum_variance = big_n * big_n * (1 - n / big_n) * variance / n
+        return float(Z_95 * np.sqrt(np.nansum(np.where(n > 1, stratum_variance, 0.0))))
+
+    def group_margins(self, sample, dimension, measure):
+        """Return the 95% margin of the estimated total of measure per dimension value"""
+        codes, uniques = pd.factorize(sample[dimension])
+        return {
+            value: self.margin(sample[codes == code], sample[measure].to_numpy()[codes == code])
+            for code, value in enumerate(np.asarray(uniques).tolist())
+        }
+
+    @traced()
+    def aggregates(self, filters):
+        """Return ApproximateAggregates for the dashboard filters"""
+        sample = self.index.apply(date_bounds(filters), index_selections(filters))
+        weight = sample['weight'].to_numpy()
+        cells = sample[CELL_DIMENSIONS].assign(
+            total_sales=sample['total_sales'].to_numpy() * weight,
+            quantity=sample['quantity'].to_numpy() * weight,
+            row_count=weight,
+        ).groupby(CELL_DIMENSIONS, observed=True, sort=False).sum().reset_index()
+        return ApproximateAggregates(cells, sample, self)
+
+    def strata_mask(self, filters):
+        """Return which strata the filters select, with the date range rounded to months"""
+        mask = np.ones(self.n_strata, dtype=bool)
+        for key, column in FILTER_COLUMNS.items():
+            values = active_values(filters, key)
+            if values is not None:
+                mask &= np.isin(self.labels[column], values)
+        bounds = date_bounds(filters)
+        if bounds is not None:
+            months = self.labels['year'].astype(np.int64) * 12 + self.labels['month'].astype(np.int64) - 1
+            start, end = (b.year * 12 + b.month - 1 for b in bounds)
+            mask &= (months >= start) & (months <= end)
+        return mask
+
+    def order_value_quantiles(self, filters, quantiles=ORDER_VALUE_QUANTILES):
+        """Return {quantile: order value} from the sketch, within RELATIVE_ACCURACY"""
+        counts = self.sketch[self.strata_mask(filters)].sum(axis=0)
+        total = counts.sum()
+        if total == 0:
+            return {q: float('nan') for q in quantiles}
+        cumulative = np.cumsum(counts)
+        result = {}
+        for q in quantiles:
+            bucket = int(np.searchsorted(cumulative, q * (total - 1), side='right'))
+            if bucket == 0:
+                result[q] = 0.0
+            else:
+                exponent = bucket + self.bucket_offset
+                result[q] = float(2 * self.gamma ** exponent / (self.gamma + 1))
+        return result
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Aggregation Benchmark
+Per-rerun cost of per-chart groupbys versus the shared aggregation engine,
+and scaling of the partition-parallel engine with worker count
+"""
+
+import argparse
+import os
+import time
+import pandas as pd
+from aggregations import compute_aggregates
+from clean_data import clean_chunk
+from generate_data import generate_sales_chunks
+from parallel_aggregation import EXECUTORS, parallel_aggregates
+from storage import compact_frame
+
+def per_chart_rerun(df):
+    """Run the groupbys each chart, KPI and insight used to compute on its own"""
+    # KPIs
+    df['total_sales'].sum(), len(df), df['total_sales'].mean(), df['quantity'].sum()
+
+    # Comprehensive dashboard and individual charts
+    for _ in range(2):
+        df.groupby('month')['total_sales'].sum()
+        df.groupby('product')['total_sales'].sum().sort_values(ascending=False)
+        df.groupby('region')['total_sales'].sum()
+        df.groupby('year')['total_sales'].sum()
+        df.groupby('salesperson')['total_sales'].sum().sort_values(ascending=False).head(10)
+
+    # Insights
+    df['total_sales'].sum()
+    df.groupby('product')['total_sales'].sum().sort_values(ascending=False)
+    df.groupby('region')['total_sales'].sum().sort_values(ascending=False)
+    df.groupby('year')['total_sales'].sum()
+    df.groupby('month')['total_sales'].sum()
+    df['total_sales'].mean()
+
+def shared_rerun(df):
+    """Compute every breakdown from one SalesAggregates pass"""
+    aggs = compute_aggregates(df)
+    aggs.kpis
+    for _ in range(2):
+        aggs.sales_by('month')
+        aggs.sales_by('product', order='desc')
+        aggs.sales_by('region')
+        aggs.sales_by('year')
+        aggs.sales_by('salesperson', order='desc', limit=10)
+    aggs.series('product', order='desc')
+    aggs.series('region', order='desc')
+    aggs.series('year')
+    aggs.series('month')
+
+def time_rerun(func, df, repeats):
+    """Return the best wall time of func(df) over several runs, in milliseconds"""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(df)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def build_frame(n_rows):
+    """Generate and clean a synthetic dataset of n_rows"""
+    return pd.concat([clean_chunk(chunk) for chunk in generate_sales_chunks(n_rows)], ignore_index=True)
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark dashboard aggregation strategies')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help='Dataset sizes to benchmark')
+    parser.add_argument('--repeats', type=int, default=5, help='Runs per measurement (best is reported)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='Worker counts for the parallel scaling table')
+    parser.add_argument('--executor', choices=EXECUTORS, default='process',
+                        help='Pool type for the parallel engine')
+    return parser.parse_args()
+
+def print_scaling(df, workers_list, executor, repeats):
+    """Print parallel aggregation time and speedup per worker count"""
+    frame = compact_frame(df)
+    serial = time_rerun(compute_aggregates, frame, repeats)
+    print(f"{'workers':>12} {'parallel ms':>14} {'serial ms':>11} {'speedup':>8}")
+    for workers in workers_list:
+        # The first call starts the pool; keep it out of the measurement
+        parallel_aggregates(frame, workers, executor)
+        parallel = time_rerun(lambda data: parallel_aggregates(data, workers, executor), frame, repeats)
+        print(f"{workers:>12} {parallel:>14.1f} {serial:>11.1f} {serial / parallel:>7.1f}x")
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    print(f"{'rows':>12} {'per-chart ms':>14} {'shared ms':>11} {'speedup':>8}")
+    for n_rows in args.rows:
+        df = build_frame(n_rows)
+        per_chart = time_rerun(per_chart_rerun, df, args.repeats)
+        shared = time_rerun(shared_rerun, df, args.repeats)
+        print(f"{n_rows:>12,} {per_chart:>14.1f} {shared:>11.1f} {per_chart / shared:>7.1f}x")
+
+    print(f"\nParallel scaling ({args.executor} pool, {os.cpu_count()} cores) at {args.rows[-1]:,} rows")
+    print_scaling(df, args.workers, args.executor, args.repeats)
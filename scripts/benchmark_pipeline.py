@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Pipeline Benchmark
+Times generate -> clean -> load -> dashboard queries at several dataset sizes,
+keeps a JSON history and flags regressions against the previous run
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_SIZES = [10_000, 1_000_000]
+DEFAULT_WORKDIR = 'data/benchmarks'
+DEFAULT_HISTORY = 'data/benchmarks/history.json'
+
+# A step regresses if it is this much slower than the previous run of the
+# same size, and slower by at least MIN_REGRESSION_SECONDS
+DEFAULT_THRESHOLD = 0.20
+MIN_REGRESSION_SECONDS = 0.05
+
+# Each stage runs in its own process so peak RSS is attributed per stage;
+# the process high-water mark cannot be split between a stage's steps
+STAGES = ['generate', 'clean', 'load', 'dashboard', 'sqlite']
+
+# Filter state used for the filtering, aggregation and chart steps
+BENCHMARK_FILTERS = {
+    'date_range': ('2022-04-01', '2023-03-31'),
+    'products': ['Product A', 'Product C'],
+    'regions': ['North', 'South', 'West'],
+    'years': ['All'],
+}
+
+def peak_rss_mb():
+    """Return this process's peak resident set size in MB, i.e. the stage's"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def timed(steps, name, n_rows, func):
+    """Run func, append its wall time and throughput to steps, and return its result"""
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    steps.append({
+        'step': name,
+        'seconds': seconds,
+        'rows_per_sec': n_rows / seconds if n_rows and seconds > 0 else None,
+    })
+    return result
+
+def dataset_paths(workdir, n_rows, fmt):
+    """Return the raw, clean and database paths for one dataset size"""
+    directory = os.path.join(workdir, str(n_rows))
+    return {
+        'dir': directory,
+        'raw': os.path.join(directory, f'sales_data.{fmt}'),
+        'clean': os.path.join(directory, f'clean_sales_data.{fmt}'),
+        'database': os.path.join(directory, 'sales.db'),
+    }
+
+def run_generate(paths, n_rows, fmt, workers):
+    """Generate the raw dataset"""
+    from generate_data import write_sales_data, write_sales_data_parallel
+
+    steps = []
+    if workers > 1:
+        timed(steps, 'generate_sales_data', n_rows,
+              lambda: write_sales_data_parallel(paths['raw'], n_rows, workers, fmt=fmt))
+    else:
+        timed(steps, 'generate_sales_data', n_rows, lambda: write_sales_data(paths['raw'], n_rows, fmt=fmt))
+    return steps
+
+def run_clean(paths, n_rows, fmt, workers):
+    """Clean the raw dataset with the streaming cleaner"""
+    from generate_data import manifest_path
+    from clean_data import clean_data_streaming
+
+    raw = manifest_path(paths['raw']) if workers > 1 else paths['raw']
+    steps = []
+    timed(steps, 'clean_data', n_rows, lambda: clean_data_streaming(raw, paths['clean']))
+    return steps
+
+def run_load(paths, n_rows, fmt, workers):
+    """Bulk load the clean dataset into SQLite"""
+    from load_to_sql import bulk_load
+
+    steps = []
+    timed(steps, 'load_to_database', n_rows, lambda: bulk_load(paths['clean'], paths['database']))
+    return steps
+
+def run_dashboard(paths, n_rows, fmt, workers):
+    """Time the in-memory dashboard path: load, filter, aggregate and build each chart"""
+    import streamlit_dashboard as dashboard
+    from filter_index import FilterIndex
+    from query_backend import DataFrameBackend, apply_filters, date_bounds
+    from storage import compact_frame, read_sales
+    from topk_index import TopKIndex
+    from trends import TrendRollups
+    from downsampling import bin_budget
+
+    steps = []
+    df = timed(steps, 'load_data', n_rows, lambda: compact_frame(
+        read_sales(paths['clean'], dashboard.DASHBOARD_COLUMNS), dashboard.FLOAT_DTYPE
+    ))
+    index = timed(steps, 'build_filter_index', n_rows, lambda: FilterIndex(df))
+    timed(steps, 'apply_filters', n_rows, lambda: apply_filters(df, BENCHMARK_FILTERS))
+
+    topk = timed(steps, 'build_topk_index', n_rows, lambda: TopKIndex(index.df))
+
+    backend = DataFrameBackend(index.df, index, topk)
+    filtered = timed(steps, 'indexed_filter', n_rows, lambda: backend.filtered(BENCHMARK_FILTERS))
+    filtered_rows = len(filtered)
+    aggs = timed(steps, 'aggregates', filtered_rows, lambda: backend.aggregates(BENCHMARK_FILTERS))
+    trend_filters = dict(BENCHMARK_FILTERS, date_range=())
+    trends = timed(steps, 'trend_rollups', n_rows,
+                   lambda: TrendRollups(backend.daily_totals(trend_filters)))
+    bins = timed(steps, 'scatter_bins', filtered_rows, lambda: backend.scatter_bins(
+        BENCHMARK_FILTERS, 'unit_price', 'quantity', 'total_sales', bin_budget()
+    ))
+    performers = timed(steps, 'top_performers', filtered_rows, lambda: dashboard.leaderboard(
+        backend, aggs, 'salesperson', BENCHMARK_FILTERS, 10
+    ))
+
+    bounds = date_bounds(BENCHMARK_FILTERS)
+    charts = {
+        'create_trends_chart': lambda: dashboard.create_trends_chart(trends.series('month', *bounds), 'month'),
+        'create_product_analysis_chart': lambda: dashboard.create_product_analysis_chart(aggs),
+        'create_regional_distribution_chart': lambda: dashboard.create_regional_distribution_chart(aggs),
+        'create_yearly_comparison_chart': lambda: dashboard.create_yearly_comparison_chart(aggs),
+        'create_top_performers_chart': lambda: dashboard.create_top_performers_chart(performers),
+        'create_price_quantity_scatter': lambda: dashboard.create_price_quantity_scatter(bins),
+        'create_comprehensive_dashboard': lambda: dashboard.create_comprehensive_dashboard(
+            aggs, trends.series('month', *bounds), bins, performers
+        ),
+    }
+    for name, build in charts.items():
+        timed(steps, name, None, build)
+    return steps
+
+def run_sqlite(paths, n_rows, fmt, workers):
+    """Time the SQLite dashboard queries"""
+    from query_backend import SQLiteBackend
+    from trends import TrendRollups
+    from downsampling import bin_budget
+
+    steps = []
+    backend = SQLiteBackend(paths['database'])
+    timed(steps, 'sqlite_aggregates', n_rows, lambda: backend.aggregates(BENCHMARK_FILTERS))
+    trend_filters = dict(BENCHMARK_FILTERS, date_range=())
+    timed(steps, 'sqlite_trend_rollups', n_rows, lambda: TrendRollups(backend.daily_totals(trend_filters)))
+    timed(steps, 'sqlite_scatter_bins', n_rows, lambda: backend.scatter_bins(
+        BENCHMARK_FILTERS, 'unit_price', 'quantity', 'total_sales', bin_budget()
+    ))
+    timed(steps, 'sqlite_page', None, lambda: backend.page(BENCHMARK_FILTERS, 0, 100))
+    return steps
+
+STAGE_RUNNERS = {
+    'generate': run_generate,
+    'clean': run_clean,
+    'load': run_load,
+    'dashboard': run_dashboard,
+    'sqlite': run_sqlite,
+}
+
+def run_stage(stage, n_rows, workdir, fmt, workers, verbose=False):
+    """Run one stage in a child process and return its timed steps and peak RSS in MB"""
+    result_file = os.path.join(dataset_paths(workdir, n_rows, fmt)['dir'], f'{stage}.result.json')
+    command = [
+        sys.executable, os.path.abspath(__file__), '--stage', stage, '--rows', str(n_rows),
+        '--workdir', workdir, '--format', fmt, '--workers', str(workers), '--result-file', result_file,
+    ]
+    output = None if verbose else subprocess.DEVNULL
+    subprocess.run(command, check=True, stdout=output, stderr=output, cwd=os.getcwd())
+    with open(result_file) as f:
+        result = json.load(f)
+    os.remove(result_file)
+    return result['steps'], result['peak_rss_mb']
+
+def run_suite(sizes, workdir, fmt='csv', workers=1, keep_data=False, verbose=False):
+    """Run every stage at every size and return one history record"""
+    record = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'format': fmt,
+        'workers': workers,
+        'results': {},
+        'peak_rss_mb': {},
+    }
+    for n_rows in sizes:
+        paths = dataset_paths(workdir, n_rows, fmt)
+        os.makedirs(paths['dir'], exist_ok=True)
+        steps = []
+        peaks = {}
+        for stage in STAGES:
+            print(f"  {n_rows:>12,} rows: {stage}...", flush=True)
+            stage_steps, peaks[stage] = run_stage(stage, n_rows, workdir, fmt, workers, verbose)
+            steps.extend(dict(step, stage=stage) for step in stage_steps)
+        record['results'][str(n_rows)] = steps
+        record['peak_rss_mb'][str(n_rows)] = peaks
+        if not keep_data:
+            shutil.rmtree(paths['dir'])
+    return record
+
+def git_commit():
+    """Return the current git commit hash, or None outside a repository"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=SCRIPTS_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_history(path):
+    """Load previous benchmark runs"""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+def save_history(path, history):
+    """Write the benchmark history"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(history, f, indent=2)
+
+def previous_run(history, size, fmt):
+    """Return the latest earlier run for a size and format, or None"""
+    for record in reversed(history):
+        if record.get('format') == fmt and str(size) in record['results']:
+            return record
+    return None
+
+def compare_runs(previous, current, threshold=DEFAULT_THRESHOLD):
+    """Return (step, previous seconds, current seconds, ratio, regressed) per common step"""
+    previous_seconds = {step['step']: step['seconds'] for step in previous}
+    comparison = []
+    for step in current:
+        name = step['step']
+        if name not in previous_seconds:
+            continue
+        before, after = previous_seconds[name], step['seconds']
+        ratio = after / before if before > 0 else float('inf')
+        regressed = ratio > 1 + threshold and after - before >= MIN_REGRESSION_SECONDS
+        comparison.append((name, before, after, ratio, regressed))
+    return comparison
+
+def print_report(record, history, threshold=DEFAULT_THRESHOLD):
+    """Print the run's results with a comparison to the previous run; return the regression count"""
+    regressions = 0
+    for size, steps in record['results'].items():
+        previous = previous_run(history, size, record['format'])
+        comparison = {c[0]: c for c in compare_runs(previous['results'][size], steps, threshold)} if previous else {}
+
+        print(f"\n📊 {int(size):,} rows")
+        print(f"{'step':<36} {'seconds':>9} {'rows/sec':>14} {'vs prev':>9}")
+        for step in steps:
+            rows_per_sec = f"{step['rows_per_sec']:,.0f}" if step['rows_per_sec'] else '-'
+            change = ''
+            if step['step'] in comparison:
+                _, _, _, ratio, regressed = comparison[step['step']]
+                change = f"{ratio:.2f}x" + (' ⚠️' if regressed else '')
+                regressions += regressed
+            print(f"{step['step']:<36} {step['seconds']:>9.3f} {rows_per_sec:>14} {change:>9}")
+
+        # Peak RSS is a per-process high-water mark, so it is reported per stage
+        previous_peaks = previous.get('peak_rss_mb', {}).get(size, {}) if previous else {}
+        print(f"{'stage':<36} {'peak MB':>9} {'vs prev':>9}")
+        for stage, peak in record['peak_rss_mb'][size].items():
+            change = f"{peak / previous_peaks[stage]:.2f}x" if previous_peaks.get(stage) else ''
+            print(f"{stage:<36} {peak:>9.0f} {change:>9}")
+
+    if regressions:
+        print(f"\n⚠️  {regressions} step(s) regressed by more than {threshold:.0%} against the previous run")
+    else:
+        print("\n✅ No regressions against the previous run")
+    return regressions
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark the sales pipeline end to end')
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='Dataset sizes to benchmark (e.g. 10000 1000000 10000000 100000000)')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv', help='Storage format for raw and clean data')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes for data generation')
+    parser.add_argument('--workdir', default=DEFAULT_WORKDIR, help='Directory for generated datasets')
+    parser.add_argument('--history', default=DEFAULT_HISTORY, help='JSON file of previous runs')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Relative slowdown that counts as a regression')
+    parser.add_argument('--keep-data', action='store_true', help='Keep generated datasets after the run')
+    parser.add_argument('--fail-on-regression', action='store_true', help='Exit non-zero if any step regressed')
+    parser.add_argument('--verbose', action='store_true', help='Show output from the stage processes')
+    parser.add_argument('--stage', choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    if args.stage:
+        # Child process: run a single stage and write its steps for the parent
+        sys.path.insert(0, SCRIPTS_DIR)
+        n_rows = args.rows[0]
+        steps = STAGE_RUNNERS[args.stage](dataset_paths(args.workdir, n_rows, args.format), n_rows, args.format, args.workers)
+        with open(args.result_file, 'w') as f:
+            json.dump({'steps': steps, 'peak_rss_mb': peak_rss_mb()}, f)
+        sys.exit(0)
+
+    print("🚀 Running pipeline benchmark...")
+    history = load_history(args.history)
+    record = run_suite(args.rows, args.workdir, args.format, args.workers, args.keep_data, args.verbose)
+    regressions = print_report(record, history, args.threshold)
+    save_history(args.history, history + [record])
+    print(f"\n💾 Results appended to {args.history}")
+
+    if args.fail_on_regression and regressions:
+        sys.exit(1)
@@ -1,34 +1,314 @@
+import argparse
+import os
+import shutil
+import tempfile
 import pandas as pd
 import numpy as np
+from storage import (CLEAN_SCHEMA, RAW_COLUMNS, is_column_store_path, is_parquet_path, iter_parquet,
+                     read_sales, write_column_store, write_parquet)
+from instrumentation import traced
 
-def clean_data(df):
-    """Clean and prepare the sales data"""
-    # Remove duplicates
-    df = df.drop_duplicates()
-    
+DEFAULT_MEMORY_BUDGET_MB = 512
+
+# Rough in-memory size of one parsed raw row, used to size chunks from the budget
+BYTES_PER_ROW_ESTIMATE = 400
+
+# Share of the memory budget given to the chunk being cleaned; the rest
+# is left for the deduplication seen-set
+CHUNK_BUDGET_SHARE = 0.5
+
+# Spilled hash runs allowed on disk before they are merged into one file,
+# which bounds how many files every lookup has to search
+MAX_SPILLED_RUNS = 4
+
+# Hashes read from each spilled run per step of an on-disk merge
+SPILL_MERGE_BLOCK = 1 << 20
+
+def clean_chunk(df):
+    """Drop missing rows and add derived date features"""
     # Handle missing values
     df = df.dropna()
-    
+
     # Convert date column to datetime
     df['date'] = pd.to_datetime(df['date'])
-    
+
     # Add derived features
     df['month'] = df['date'].dt.month
     df['year'] = df['date'].dt.year
     df['quarter'] = df['date'].dt.quarter
-    
+
     return df
 
+@traced()
+def clean_data(df):
+    """Clean and prepare the sales data"""
+    # Remove duplicates
+    df = df.drop_duplicates()
+
+    return clean_chunk(df)
+
+def row_hashes(df):
+    """Return a 64-bit hash per row over the raw columns"""
+    columns = [col for col in RAW_COLUMNS if col in df.columns]
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+
+class RowHashSet:
+    """Exact seen-set of 64-bit row hashes
+
+    Hashes are kept in sorted runs that are merged as they grow, so lookups
+    are binary searches and inserts stay amortized O(n log n). When
+    spill_dir is set and the in-memory runs exceed max_bytes, the largest
+    run is moved to a memory-mapped file on disk; once more than
+    MAX_SPILLED_RUNS files exist they are merged on disk into one, so a
+    lookup searches a bounded number of files.
+    """
+
+    def __init__(self, max_bytes=None, spill_dir=None):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.runs = []
+        self.spilled = []
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs + self.spilled)
+
+    def contains(self, hashes):
+        """Return a boolean mask of which hashes were already added"""
+        found = np.zeros(len(hashes), dtype=bool)
+        for run in self.runs + self.spilled:
+            pos = np.searchsorted(run, hashes)
+            pos[pos == len(run)] = 0
+            found |= run[pos] == hashes
+        return found
+
+    def add(self, hashes):
+        """Add hashes that are not yet in the set"""
+        if len(hashes) == 0:
+            return
+        self.runs.append(np.sort(hashes))
+        while len(self.runs) > 1 and len(self.runs[-2]) <= 2 * len(self.runs[-1]):
+            merged = np.sort(np.concatenate([self.runs.pop(), self.runs.pop()]), kind='mergesort')
+            self.runs.append(merged)
+        self._maybe_spill()
+
+    def _maybe_spill(self):
+        """Move the largest in-memory run to disk while over budget"""
+        if self.spill_dir is None or self.max_bytes is None:
+            return
+        while self.runs and sum(run.nbytes for run in self.runs) > self.max_bytes:
+            largest = max(range(len(self.runs)), key=lambda i: len(self.runs[i]))
+            run = self.runs.pop(largest)
+            self.spilled.append(self._write_run(len(run), [run]))
+        if len(self.spilled) > MAX_SPILLED_RUNS:
+            self._merge_spilled()
+
+    def _write_run(self, n, blocks):
+        """Write sorted blocks totalling n hashes to a spill file and map it"""
+        fd, path = tempfile.mkstemp(suffix='.hashes', dir=self.spill_dir)
+        os.close(fd)
+        spilled = np.memmap(path, dtype=np.uint64, mode='w+', shape=(n,))
+        offset = 0
+        for block in blocks:
+            spilled[offset:offset + len(block)] = block
+            offset += len(block)
+        spilled.flush()
+        return np.memmap(path, dtype=np.uint64, mode='r', shape=(n,))
+
+    def _merge_spilled(self):
+        """K-way merge every spilled run into one file, a block at a time
+
+        Each step reads up to SPILL_MERGE_BLOCK hashes from every run and
+        emits all hashes up to the smallest of the blocks' last values, so
+        memory stays bounded by the number of runs times the block size.
+        """
+        runs = self.spilled
+        n = sum(len(run) for run in runs)
+
+        def blocks():
+            starts = [0] * len(runs)
+            while True:
+                live = [i for i, run in enumerate(runs) if starts[i] < len(run)]
+                if not live:
+                    return
+                heads = {i: runs[i][starts[i]:starts[i] + SPILL_MERGE_BLOCK] for i in live}
+                cutoff = min(head[-1] for head in heads.values())
+                parts = []
+                for i, head in heads.items():
+                    take = int(np.searchsorted(head, cutoff, side='right'))
+                    parts.append(head[:take])
+                    starts[i] += take
+                yield np.sort(np.concatenate(parts), kind='mergesort')
+
+        merged = self._write_run(n, blocks())
+        paths = [run.filename for run in runs]
+        self.spilled = [merged]
+        for path in paths:
+            os.remove(path)
+
+    def close(self):
+        """Release the set and delete any spill files"""
+        paths = [run.filename for run in self.spilled]
+        self.runs = []
+        self.spilled = []
+        for path in paths:
+            os.remove(path)
+
+class BloomFilter:
+    """Fixed-size Bloom filter over 64-bit row hashes
+
+    Uses a constant amount of memory regardless of input size, at the cost
+    of occasionally treating a new row as a duplicate.
+    """
+
+    def __init__(self, n_bytes, n_hashes=7):
+        self.n_bits = np.uint64(max(n_bytes, 1) * 8)
+        self.n_hashes = n_hashes
+        self.bits = np.zeros(max(n_bytes, 1), dtype=np.uint8)
+
+    def _positions(self, hashes):
+        """Yield bit positions for each hash function (double hashing)"""
+        h1 = hashes & np.uint64(0xFFFFFFFF)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        for i in range(self.n_hashes):
+            yield (h1 + np.uint64(i) * h2) % self.n_bits
+
+    def contains(self, hashes):
+        """Return a boolean mask of which hashes may already have been added"""
+        found = np.ones(len(hashes), dtype=bool)
+        for pos in self._positions(hashes):
+            found &= (self.bits[pos >> np.uint64(3)] >> (pos & np.uint64(7)).astype(np.uint8)) & 1 == 1
+        return found
+
+    def add(self, hashes):
+        """Add hashes to the filter"""
+        for pos in self._positions(hashes):
+            np.bitwise_or.at(self.bits, pos >> np.uint64(3), np.left_shift(1, pos & np.uint64(7)).astype(np.uint8))
+
+def make_seen_set(dedup, max_bytes, spill_dir=None):
+    """Create the cross-chunk deduplication structure"""
+    if dedup == 'exact':
+        return RowHashSet(max_bytes, spill_dir)
+    if dedup == 'bloom':
+        return BloomFilter(max_bytes)
+    return None
+
+def iter_raw_chunks(input_path, chunk_size):
+    """Yield raw data in chunks from a CSV file, Parquet dataset or generator manifest"""
+    if input_path.endswith('.json'):
+        from generate_data import read_manifest_parts
+        for part in read_manifest_parts(input_path):
+            yield from iter_raw_chunks(part, chunk_size)
+    elif is_parquet_path(input_path):
+        yield from iter_parquet(input_path, columns=RAW_COLUMNS, batch_size=chunk_size)
+    else:
+        yield from pd.read_csv(input_path, chunksize=chunk_size)
+
+@traced()
+def clean_data_streaming(input_path, output_path, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB,
+                         chunk_size=None, dedup='exact', spill_dir=None):
+    """Clean raw data chunk by chunk, writing the output incrementally
+
+    Peak memory is bounded by memory_budget_mb rather than the input size:
+    half the budget sizes the chunks and the other half holds the
+    deduplication seen-set ('exact' 64-bit row hashes, spilled to
+    memory-mapped files in spill_dir when it outgrows the budget, or a
+    fixed-size 'bloom' filter; 'none' disables deduplication). Without a
+    spill_dir, exact hashes spill to a temporary directory that is removed
+    afterwards. A column store output is streamed to disk too, and only its
+    date sort order (8 bytes per row) is held in memory. Returns a dict of
+    row counts.
+    """
+    budget_bytes = int(memory_budget_mb * 1024 * 1024)
+    if chunk_size is None:
+        chunk_size = max(10_000, int(budget_bytes * CHUNK_BUDGET_SHARE / BYTES_PER_ROW_ESTIMATE))
+    temporary_spill_dir = None
+    if dedup == 'exact' and spill_dir is None:
+        temporary_spill_dir = spill_dir = tempfile.mkdtemp(prefix='sales_dedup_')
+    seen = make_seen_set(dedup, int(budget_bytes * (1 - CHUNK_BUDGET_SHARE)), spill_dir)
+    stats = {'rows_in': 0, 'rows_out': 0, 'duplicates': 0, 'missing': 0}
+
+    def cleaned_chunks():
+        for chunk in iter_raw_chunks(input_path, chunk_size):
+            stats['rows_in'] += len(chunk)
+            cleaned = clean_chunk(chunk)
+            stats['missing'] += len(chunk) - len(cleaned)
+
+            if seen is not None and len(cleaned) > 0:
+                hashes = row_hashes(cleaned)
+                # Keep the first occurrence within the chunk, then drop rows seen in earlier chunks
+                _, first = np.unique(hashes, return_index=True)
+                keep = np.zeros(len(cleaned), dtype=bool)
+                keep[first] = True
+                keep[keep] = ~seen.contains(hashes[keep])
+                seen.add(hashes[keep])
+                stats['duplicates'] += int(len(cleaned) - keep.sum())
+                cleaned = cleaned[keep]
+
+            stats['rows_out'] += len(cleaned)
+            yield cleaned
+
+    try:
+        if is_column_store_path(output_path):
+            write_column_store(cleaned_chunks(), output_path)
+        elif is_parquet_path(output_path):
+            write_parquet(cleaned_chunks(), output_path, CLEAN_SCHEMA)
+        else:
+            with open(output_path, 'w', newline='') as f:
+                for i, cleaned in enumerate(cleaned_chunks()):
+                    cleaned.to_csv(f, header=(i == 0), index=False)
+    finally:
+        if isinstance(seen, RowHashSet):
+            seen.close()
+        if temporary_spill_dir is not None:
+            shutil.rmtree(temporary_spill_dir, ignore_errors=True)
+    return stats
+
+def save_clean_data(df, output_path):
+    """Save cleaned data as CSV, a typed, partitioned Parquet dataset or a column store"""
+    if is_column_store_path(output_path):
+        write_column_store(df, output_path)
+    elif is_parquet_path(output_path):
+        write_parquet(df, output_path, CLEAN_SCHEMA)
+    else:
+        df.to_csv(output_path, index=False)
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Clean raw sales data')
+    parser.add_argument('--input', default='data/sales_data.csv',
+                        help='Raw data: a CSV file, a .parquet dataset or a generator manifest (.json)')
+    parser.add_argument('--output', default='data/clean_sales_data.csv',
+                        help='Cleaned data: a CSV file, a .parquet dataset or a .columns store')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Clean out-of-core in chunks with bounded memory')
+    parser.add_argument('--memory-budget-mb', type=float, default=DEFAULT_MEMORY_BUDGET_MB,
+                        help='Memory budget for streaming mode')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='Rows per chunk in streaming mode (default: derived from the budget)')
+    parser.add_argument('--dedup', choices=['exact', 'bloom', 'none'], default='exact',
+                        help='Cross-chunk deduplication strategy in streaming mode')
+    parser.add_argument('--spill-dir', default=None,
+                        help='Directory for spilling exact row hashes once they exceed the budget '
+                             '(default: a temporary directory)')
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    # Load raw data
-    df = pd.read_csv('data/sales_data.csv')
-    print(f"Original data shape: {df.shape}")
-    
-    # Clean data
-    cleaned_df = clean_data(df)
-    print(f"Cleaned data shape: {cleaned_df.shape}")
-    
-    # Save cleaned data
-    cleaned_df.to_csv('data/clean_sales_data.csv', index=False)
-    print("Cleaned data saved successfully")
+    args = parse_args()
 
+    if args.streaming:
+        stats = clean_data_streaming(args.input, args.output, args.memory_budget_mb,
+                                     args.chunk_size, args.dedup, args.spill_dir)
+        print(f"Streamed {stats['rows_in']:,} rows: {stats['rows_out']:,} kept, "
+              f"{stats['duplicates']:,} duplicates, {stats['missing']:,} with missing values")
+    else:
+        # Load raw data
+        df = read_sales(args.input, columns=RAW_COLUMNS if is_parquet_path(args.input) else None)
+        print(f"Original data shape: {df.shape}")
+
+        # Clean data
+        cleaned_df = clean_data(df)
+        print(f"Cleaned data shape: {cleaned_df.shape}")
+
+        # Save cleaned data
+        save_clean_data(cleaned_df, args.output)
+    print("Cleaned data saved successfully")
@@ -0,0 +1,99 @@
+"""
+Data Export
+Stream filtered rows in chunks to a compressed temporary file for download
+"""
+
+import gzip
+import os
+import tempfile
+import time
+import pyarrow as pa
+import pyarrow.parquet as pq
+from instrumentation import traced
+
+EXPORT_FORMATS = {
+    'csv.gz': 'application/gzip',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+DEFAULT_EXPORT_CHUNK_SIZE = 250_000
+
+EXPORT_PREFIX = 'sales_export_'
+
+# Exports left behind by an interrupted download or a killed server are
+# removed once they are this old
+EXPORT_TTL_SECONDS = 60 * 60
+
+@traced()
+def export_chunks(chunks, fmt='csv.gz', directory=None):
+    """Write DataFrame chunks to a temporary CSV.gz or Parquet file
+
+    Only one chunk is held in memory at a time. Returns the file path and
+    the number of rows written; the caller owns (and removes) the file.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    handle, path = tempfile.mkstemp(suffix=f'.{fmt}', prefix=EXPORT_PREFIX, dir=directory)
+    os.close(handle)
+
+    rows_written = 0
+    try:
+        if fmt == 'csv.gz':
+            with gzip.open(path, 'wt', newline='', compresslevel=6) as f:
+                for chunk in chunks:
+                    chunk.to_csv(f, header=rows_written == 0, index=False)
+                    rows_written += len(chunk)
+        else:
+            writer = None
+            try:
+                for chunk in chunks:
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(path, table.schema, compression='zstd')
+                    writer.write_table(table.cast(writer.schema))
+                    rows_written += len(chunk)
+            finally:
+                if writer is not None:
+                    writer.close()
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, rows_written
+
+def remove_export(path):
+    """Delete a previously exported file if it still exists"""
+    if path and os.path.exists(path):
+        os.remove(path)
+
+def sweep_exports(max_age_seconds=EXPORT_TTL_SECONDS, directory=None):
+    """Delete export files older than max_age_seconds; returns how many were removed"""
+    directory = directory or tempfile.gettempdir()
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for name in os.listdir(directory):
+        if not name.startswith(EXPORT_PREFIX):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            # Removed by its owner or another sweep in the meantime
+            pass
+    return removed
+
+def export_bytes(chunks, fmt='csv.gz', directory=None):
+    """Export DataFrame chunks and return the file contents
+
+    The chunks are streamed to a temporary file, which is read once and
+    removed; stale exports from earlier runs are swept first.
+    """
+    sweep_exports(directory=directory)
+    path, _ = export_chunks(chunks, fmt, directory)
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    finally:
+        remove_export(path)
@@ -0,0 +1,112 @@
+"""
+Downsampling
+Pixel-budgeted reduction of line series (LTTB) and scatters (density bins)
+"""
+
+import numpy as np
+import pandas as pd
+from instrumentation import traced
+
+# Screen area assumed for a half-width dashboard chart
+CHART_WIDTH_PX = 600
+CHART_HEIGHT_PX = 400
+
+# Line series keep about one point per horizontal pixel; scatter bins are
+# BIN_PX pixels on a side
+POINTS_PER_PX = 1
+BIN_PX = 10
+
+def point_budget(width_px=CHART_WIDTH_PX):
+    """Return the number of line points worth drawing at width_px"""
+    return max(3, int(width_px * POINTS_PER_PX))
+
+def bin_budget(width_px=CHART_WIDTH_PX, height_px=CHART_HEIGHT_PX):
+    """Return the (x, y) scatter bin counts for a chart of the given size"""
+    return max(1, width_px // BIN_PX), max(1, height_px // BIN_PX)
+
+def lttb_indices(x, y, n_out):
+    """Return the indices of the points kept by Largest-Triangle-Three-Buckets
+
+    x must be sorted. The first and last points are always kept; each
+    bucket in between keeps the point forming the largest triangle with the
+    previously kept point and the mean of the next bucket.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = n - 1
+
+    previous = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
+
+def downsample_series(df, x, y, n_out=None):
+    """Reduce a line series, sorted by x, to at most n_out points with LTTB"""
+    n_out = point_budget() if n_out is None else n_out
+    if len(df) <= n_out:
+        return df
+    x_values = df[x]
+    if pd.api.types.is_datetime64_any_dtype(x_values):
+        x_values = x_values.astype('int64')
+    return df.iloc[lttb_indices(x_values, df[y], n_out)]
+
+def bins_to_frame(ix, iy, counts, weight_sums, ranges, bins, x, y, weight):
+    """Turn occupied bin indices and totals into a frame of bin centers"""
+    (x_lo, x_hi), (y_lo, y_hi) = ranges
+    nx, ny = bins
+    x_width = (x_hi - x_lo) / nx if x_hi > x_lo else 1.0
+    y_width = (y_hi - y_lo) / ny if y_hi > y_lo else 1.0
+    counts = np.asarray(counts, dtype=np.int64)
+    data = {
+        x: x_lo + (np.asarray(ix) + 0.5) * x_width,
+        y: y_lo + (np.asarray(iy) + 0.5) * y_width,
+        'count': counts,
+    }
+    if weight is not None:
+        data[f'mean_{weight}'] = np.asarray(weight_sums, dtype=np.float64) / counts
+    return pd.DataFrame(data)
+
+@traced()
+def density_bins(df, x, y, weight=None, bins=None):
+    """Aggregate a scatter into a 2D grid of counts and mean weights
+
+    Every occupied bin is kept, so sparse outliers stay visible while the
+    output size is bounded by the bin grid rather than the row count.
+    """
+    nx, ny = bin_budget() if bins is None else bins
+    if len(df) == 0:
+        return bins_to_frame([], [], [], [], ((0, 0), (0, 0)), (nx, ny), x, y, weight)
+
+    x_values = df[x].to_numpy(dtype=np.float64)
+    y_values = df[y].to_numpy(dtype=np.float64)
+    ranges = ((x_values.min(), x_values.max()), (y_values.min(), y_values.max()))
+
+    def bin_index(values, lo, hi, n_bins):
+        scale = n_bins / (hi - lo) if hi > lo else 0.0
+        return np.minimum(((values - lo) * scale).astype(np.int64), n_bins - 1)
+
+    cells = bin_index(x_values, *ranges[0], nx) * ny + bin_index(y_values, *ranges[1], ny)
+    counts = np.bincount(cells, minlength=nx * ny)
+    occupied = np.flatnonzero(counts)
+    weight_sums = None
+    if weight is not None:
+        weight_sums = np.bincount(cells, weights=df[weight].to_numpy(dtype=np.float64), minlength=nx * ny)[occupied]
+    ix, iy = np.divmod(occupied, ny)
+    return bins_to_frame(ix, iy, counts[occupied], weight_sums, ranges, (nx, ny), x, y, weight)
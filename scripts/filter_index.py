@@ -0,0 +1,100 @@
+"""
+Filter Index
+Bitmap and row-id indexes built once at load time for fast dashboard filtering
+"""
+
+import numpy as np
+import pandas as pd
+from instrumentation import traced
+
+INDEXED_COLUMNS = ['product', 'region', 'salesperson', 'year']
+
+# Columns with more distinct values than this get row-id lists instead of
+# per-value bitmaps, which would cost rows/8 bytes per value
+MAX_BITMAP_CARDINALITY = 256
+
+class FilterIndex:
+    """Dictionary-encoded filter index over a date-sorted frame
+
+    Each indexed column is factorized to integer codes. Low-cardinality
+    columns keep one packed bitmap per value; high-cardinality columns keep
+    the sorted row ids of each value. Dates are held as a sorted array so a
+    date range is a binary-searched [lo, hi) slice. A filter combines the
+    selected values' bitmaps per column, intersects the columns, and takes
+    only the matching rows.
+    """
+
+    def __init__(self, df, columns=INDEXED_COLUMNS):
+        if not df['date'].is_monotonic_increasing:
+            df = df.sort_values('date', kind='stable')
+        # Already-sorted frames (e.g. a mapped column store) are not copied
+        self.df = df.reset_index(drop=True)
+        self.dates = self.df['date'].to_numpy()
+        self.n_rows = len(self.df)
+        self.values = {}
+        self.bitmaps = {}
+        self.row_ids = {}
+
+        for column in columns:
+            if column not in self.df.columns:
+                continue
+            codes, uniques = pd.factorize(self.df[column])
+            self.values[column] = {value: code for code, value in enumerate(uniques.tolist())}
+            if len(uniques) <= MAX_BITMAP_CARDINALITY:
+                self.bitmaps[column] = [np.packbits(codes == code) for code in range(len(uniques))]
+            else:
+                order = np.argsort(codes, kind='stable')
+                bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+                self.row_ids[column] = [order[bounds[i]:bounds[i + 1]] for i in range(len(uniques))]
+
+    def date_slice(self, bounds):
+        """Return the [lo, hi) row range for a (start, end) date range"""
+        if bounds is None:
+            return 0, self.n_rows
+        start, end = (np.datetime64(pd.Timestamp(b), 'ns').astype(self.dates.dtype) for b in bounds)
+        return int(np.searchsorted(self.dates, start, 'left')), int(np.searchsorted(self.dates, end, 'right'))
+
+    def column_bitmap(self, column, values):
+        """Return the packed bitmap of rows whose column is in values"""
+        codes = [self.values[column][v] for v in values if v in self.values[column]]
+        n_bytes = (self.n_rows + 7) // 8
+        if column in self.bitmaps:
+            bitmap = np.zeros(n_bytes, dtype=np.uint8)
+            for code in codes:
+                bitmap |= self.bitmaps[column][code]
+            return bitmap
+        mask = np.zeros(self.n_rows, dtype=bool)
+        for code in codes:
+            mask[self.row_ids[column][code]] = True
+        return np.packbits(mask)
+
+    def select(self, bounds=None, selections=None):
+        """Resolve a filter to a row slice or an array of row positions
+
+        selections maps indexed column names to the values to keep; columns
+        that are absent or None are not filtered.
+        """
+        lo, hi = self.date_slice(bounds)
+        active = {column: values for column, values in (selections or {}).items() if values is not None}
+        if not active:
+            return slice(lo, hi)
+
+        combined = None
+        for column, values in active.items():
+            bitmap = self.column_bitmap(column, values)
+            combined = bitmap if combined is None else combined & bitmap
+
+        # Unpack only the bytes covering the date range
+        first_byte = lo // 8
+        mask = np.unpackbits(combined[first_byte:(hi + 7) // 8])[lo - first_byte * 8:hi - first_byte * 8]
+        return lo + np.flatnonzero(mask)
+
+    @traced()
+    def apply(self, bounds=None, selections=None):
+        """Return the filtered rows without copying the full frame"""
+        rows = self.select(bounds, selections)
+        if isinstance(rows, slice):
+            if rows.start == 0 and rows.stop == self.n_rows:
+                return self.df
+            return self.df.iloc[rows]
+        return self.df.take(rows)
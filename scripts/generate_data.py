@@ -1,51 +1,251 @@
+import argparse
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import random
+import shutil
+from storage import RAW_SCHEMA, write_parquet
+from instrumentation import traced
 
 # Set random seed for reproducibility
 np.random.seed(42)
 random.seed(42)
 
+# Date range: last 2 years
+START_DATE = datetime(2022, 1, 1)
+END_DATE = datetime(2023, 12, 31)
+
+PRODUCTS = ['Product A', 'Product B', 'Product C', 'Product D', 'Product E']
+REGIONS = ['North', 'South', 'East', 'West', 'Central']
+SALESPEOPLE = ['John Doe', 'Jane Smith', 'Bob Johnson', 'Alice Brown', 'Charlie Wilson']
+
+DEFAULT_ROWS = 10000
+DEFAULT_CHUNK_SIZE = 1_000_000
+DEFAULT_SEED = 42
+
+# Rows are drawn in fixed-size blocks, each with its own seed stream, so the
+# values for a given seed do not depend on the chunk size used to write them.
+BLOCK_SIZE = 65_536
+
 def generate_sales_data():
     """Generate mock sales data"""
-    # Date range: last 2 years
-    start_date = datetime(2022, 1, 1)
-    end_date = datetime(2023, 12, 31)
-    
     # Generate random dates
-    date_range = pd.date_range(start_date, end_date, freq='D')
-    
-    # Products
-    products = ['Product A', 'Product B', 'Product C', 'Product D', 'Product E']
-    
-    # Regions
-    regions = ['North', 'South', 'East', 'West', 'Central']
-    
-    # Salespeople
-    salespeople = ['John Doe', 'Jane Smith', 'Bob Johnson', 'Alice Brown', 'Charlie Wilson']
-    
+    date_range = pd.date_range(START_DATE, END_DATE, freq='D')
+
     data = []
-    for _ in range(10000):  # Generate 10,000 records
+    for _ in range(DEFAULT_ROWS):  # Generate 10,000 records
         record = {
             'date': random.choice(date_range),
-            'product': random.choice(products),
-            'region': random.choice(regions),
-            'salesperson': random.choice(salespeople),
+            'product': random.choice(PRODUCTS),
+            'region': random.choice(REGIONS),
+            'salesperson': random.choice(SALESPEOPLE),
             'quantity': random.randint(1, 100),
             'unit_price': round(random.uniform(10, 1000), 2),
         }
         record['total_sales'] = record['quantity'] * record['unit_price']
         data.append(record)
-    
+
     df = pd.DataFrame(data)
     return df
 
+def generate_block(seed, block, n_rows):
+    """Generate one block of mock sales data with NumPy array sampling"""
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(block,)))
+    dates = pd.date_range(START_DATE, END_DATE, freq='D').values
+
+    quantity = rng.integers(1, 101, size=n_rows)
+    unit_price = np.round(rng.uniform(10, 1000, size=n_rows), 2)
+    return pd.DataFrame({
+        'date': dates[rng.integers(0, len(dates), size=n_rows)],
+        'product': pd.Categorical.from_codes(rng.integers(0, len(PRODUCTS), size=n_rows), PRODUCTS),
+        'region': pd.Categorical.from_codes(rng.integers(0, len(REGIONS), size=n_rows), REGIONS),
+        'salesperson': pd.Categorical.from_codes(rng.integers(0, len(SALESPEOPLE), size=n_rows), SALESPEOPLE),
+        'quantity': quantity,
+        'unit_price': unit_price,
+        'total_sales': quantity * unit_price,
+    })
+
+def generate_sales_chunks(n_rows=DEFAULT_ROWS, chunk_size=DEFAULT_CHUNK_SIZE, seed=DEFAULT_SEED, row_range=None):
+    """Yield mock sales data as DataFrame chunks of at most chunk_size rows
+
+    row_range=(start, stop) restricts generation to a slice of the n_rows
+    dataset; the rows produced are the same as in the full run.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be at least 1: {chunk_size}")
+    start, stop = row_range if row_range is not None else (0, n_rows)
+    pending = []
+    pending_rows = 0
+
+    for block in range(start // BLOCK_SIZE, -(-stop // BLOCK_SIZE)):
+        block_start = block * BLOCK_SIZE
+        frame = generate_block(seed, block, min(BLOCK_SIZE, n_rows - block_start))
+        frame = frame.iloc[max(start - block_start, 0):stop - block_start]
+
+        while len(frame) > 0:
+            take = chunk_size - pending_rows
+            pending.append(frame.iloc[:take])
+            pending_rows += len(pending[-1])
+            frame = frame.iloc[take:]
+
+            if pending_rows == chunk_size:
+                yield pd.concat(pending, ignore_index=True)
+                pending = []
+                pending_rows = 0
+
+    if pending:
+        yield pd.concat(pending, ignore_index=True)
+
+@traced()
+def write_sales_data(output_path, n_rows=DEFAULT_ROWS, chunk_size=DEFAULT_CHUNK_SIZE, seed=DEFAULT_SEED,
+                     row_range=None, fmt='csv', part=None):
+    """Stream generated chunks to a CSV file or Parquet dataset and return the number of rows written"""
+    chunks = generate_sales_chunks(n_rows, chunk_size, seed, row_range)
+    if fmt == 'parquet':
+        if part is None:
+            return write_parquet(chunks, output_path, RAW_SCHEMA)
+        # Parallel workers share one dataset directory, cleared up front by the caller
+        return write_parquet(chunks, output_path, RAW_SCHEMA,
+                             basename_template=f'part-{part:05d}-{{i}}.parquet', overwrite=False)
+
+    rows_written = 0
+    with open(output_path, 'w', newline='') as f:
+        for chunk in chunks:
+            chunk.to_csv(f, header=(rows_written == 0), index=False)
+            rows_written += len(chunk)
+    return rows_written
+
+def shard_row_ranges(n_rows, workers):
+    """Split [0, n_rows) into per-worker ranges aligned to generator blocks"""
+    n_blocks = -(-n_rows // BLOCK_SIZE)
+    bounds = [min(n_rows, (n_blocks * i // workers) * BLOCK_SIZE) for i in range(workers + 1)]
+    return [(lo, hi) for lo, hi in zip(bounds, bounds[1:]) if hi > lo]
+
+def part_path(output_path, part):
+    """Return the part file path for a sharded output"""
+    root, ext = os.path.splitext(output_path)
+    return f"{root}.part-{part:05d}{ext}"
+
+def manifest_path(output_path):
+    """Return the manifest path for a sharded output"""
+    root, _ = os.path.splitext(output_path)
+    return f"{root}.manifest.json"
+
+def _write_part(job):
+    """Process pool entry point: write one part file"""
+    path, n_rows, chunk_size, seed, row_range, fmt, part = job
+    return write_sales_data(path, n_rows, chunk_size, seed, row_range, fmt, part)
+
+@traced()
+def write_sales_data_parallel(output_path, n_rows, workers, chunk_size=DEFAULT_CHUNK_SIZE, seed=DEFAULT_SEED,
+                              fmt='csv'):
+    """Generate the dataset across a process pool, one part file per worker
+
+    Each worker owns a contiguous range of blocks, and every block draws from
+    its own SeedSequence child, so worker streams are independent and the part
+    files are byte-identical across reruns with the same seed. Returns the
+    manifest dict, which is also written next to the parts. Parquet parts are
+    written into a single partitioned dataset at output_path.
+    """
+    row_ranges = shard_row_ranges(n_rows, workers)
+    if fmt == 'parquet':
+        shutil.rmtree(output_path, ignore_errors=True)
+        jobs = [
+            (output_path, n_rows, chunk_size, seed, row_range, fmt, part)
+            for part, row_range in enumerate(row_ranges)
+        ]
+    else:
+        jobs = [
+            (part_path(output_path, part), n_rows, chunk_size, seed, row_range, fmt, None)
+            for part, row_range in enumerate(row_ranges)
+        ]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        rows_written = list(pool.map(_write_part, jobs))
+
+    manifest = {
+        'seed': seed,
+        'rows': n_rows,
+        'workers': workers,
+        'block_size': BLOCK_SIZE,
+        'format': fmt,
+        'parts': [
+            {
+                'path': (
+                    os.path.join(os.path.basename(output_path), '**', f'part-{job[6]:05d}-*.parquet')
+                    if fmt == 'parquet' else os.path.basename(job[0])
+                ),
+                'start_row': job[4][0],
+                'rows': rows,
+            }
+            for job, rows in zip(jobs, rows_written)
+        ],
+    }
+    with open(manifest_path(output_path), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def read_manifest_parts(manifest_file):
+    """Return the part file paths listed in a manifest, in row order"""
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    base_dir = os.path.dirname(manifest_file)
+    paths = []
+    for part in manifest['parts']:
+        # Parquet parts are spread over partition directories, so expand the pattern
+        paths.extend(sorted(glob.glob(os.path.join(base_dir, part['path']), recursive=True)))
+    return paths
+
+def positive_int(value):
+    """argparse type for integers of at least 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1: {value}")
+    return number
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Generate mock sales data')
+    parser.add_argument('--rows', type=int, default=None,
+                        help='Number of rows to generate with the chunked generator '
+                             '(default: the original 10,000-row dataset)')
+    parser.add_argument('--chunk-size', type=positive_int, default=DEFAULT_CHUNK_SIZE,
+                        help='Rows held in memory per chunk')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='Random seed')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Generate in parallel, writing one part file per worker plus a manifest')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv',
+                        help='Output format; parquet writes a year/month partitioned dataset')
+    parser.add_argument('--output', default=None,
+                        help='Output path (default: data/sales_data.csv or data/sales_data.parquet)')
+    args = parser.parse_args()
+    if args.output is None:
+        args.output = f'data/sales_data.{args.format}'
+    return args
+
 if __name__ == "__main__":
-    # Generate data
-    sales_data = generate_sales_data()
-    
-    # Save to CSV
-    sales_data.to_csv('data/sales_data.csv', index=False)
-    print(f"Generated {len(sales_data)} sales records")
-    print(sales_data.head())
+    args = parse_args()
+
+    if args.workers > 1:
+        manifest = write_sales_data_parallel(
+            args.output, args.rows or DEFAULT_ROWS, args.workers, args.chunk_size, args.seed, args.format
+        )
+        print(f"Generated {manifest['rows']:,} sales records in {len(manifest['parts'])} parts")
+        print(f"Manifest written to {manifest_path(args.output)}")
+    elif args.rows is None and args.format == 'csv':
+        # Generate data
+        sales_data = generate_sales_data()
+
+        # Save to CSV
+        sales_data.to_csv(args.output, index=False)
+        print(f"Generated {len(sales_data)} sales records")
+        print(sales_data.head())
+    else:
+        rows_written = write_sales_data(
+            args.output, args.rows or DEFAULT_ROWS, args.chunk_size, args.seed, fmt=args.format
+        )
+        print(f"Generated {rows_written:,} sales records in chunks of {args.chunk_size:,}")
@@ -0,0 +1,128 @@
+"""
+Instrumentation
+Lightweight timing spans for the dashboard and pipeline scripts
+
+Tracing is off by default. Set SALES_TRACE=1 to collect spans, and
+SALES_TRACE_FILE=<path> to also append them as JSON lines to a trace file.
+The dashboard enables collection per rerun from its performance panel.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+TRACE_FILE = os.environ.get('SALES_TRACE_FILE')
+ENABLED = bool(TRACE_FILE) or os.environ.get('SALES_TRACE', '') not in ('', '0')
+
+class _ThreadState(threading.local):
+    """Per-thread tracing state; Streamlit runs each session on its own thread"""
+    enabled = False
+    spans = None
+    depth = 0
+
+_local = _ThreadState()
+_file_lock = threading.Lock()
+_trace_file = None
+
+# Returned by span() when tracing is off, so a disabled span costs one check
+_NOOP = nullcontext()
+
+def is_enabled():
+    """Return True if spans are recorded on this thread"""
+    return ENABLED or _local.enabled
+
+def configure(enabled=None, trace_file=None):
+    """Turn tracing on or off globally and optionally set the trace file"""
+    global ENABLED, TRACE_FILE, _trace_file
+    if enabled is not None:
+        ENABLED = enabled
+    if trace_file is not None and trace_file != TRACE_FILE:
+        with _file_lock:
+            if _trace_file is not None:
+                _trace_file.close()
+            _trace_file = None
+            TRACE_FILE = trace_file
+
+def _write(record):
+    """Append a finished span to the trace file"""
+    global _trace_file
+    with _file_lock:
+        if _trace_file is None:
+            _trace_file = open(TRACE_FILE, 'a', buffering=1)
+        _trace_file.write(json.dumps(record) + '\n')
+
+class Span:
+    """Times a block and records it on exit"""
+
+    __slots__ = ('name', 'attrs', 'start', 'depth')
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.depth = _local.depth
+        _local.depth = self.depth + 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_ms = (time.perf_counter() - self.start) * 1000
+        _local.depth = self.depth
+        record = {
+            'name': self.name,
+            'duration_ms': duration_ms,
+            'depth': self.depth,
+            'thread': threading.current_thread().name,
+            'timestamp': time.time(),
+        }
+        if self.attrs:
+            record['attrs'] = self.attrs
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+
+        spans = _local.spans
+        if spans is not None:
+            spans.append(record)
+        if TRACE_FILE:
+            _write(record)
+        return False
+
+def span(name, **attrs):
+    """Context manager timing a named block when tracing is enabled"""
+    if not is_enabled():
+        return _NOOP
+    return Span(name, attrs)
+
+def traced(name=None):
+    """Decorator wrapping every call of a function in a span"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not is_enabled():
+                return func(*args, **kwargs)
+            with Span(span_name, None):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextmanager
+def collect(enabled=True):
+    """Enable tracing on this thread and gather its finished spans in a list
+
+    Spans are appended in completion order; nested spans carry their depth.
+    """
+    previous = (_local.enabled, _local.spans, _local.depth)
+    spans = []
+    _local.enabled = enabled
+    _local.spans = spans if enabled else None
+    _local.depth = 0
+    try:
+        yield spans
+    finally:
+        _local.enabled, _local.spans, _local.depth = previous
@@ -0,0 +1,162 @@
+"""
+Parallel Aggregation
+Partition-parallel SalesAggregates over shared-memory column buffers
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context, shared_memory
+import numpy as np
+import pandas as pd
+from aggregations import CELL_DIMENSIONS, MAX_DENSE_CELLS, compute_aggregates, decode_cells
+from instrumentation import traced
+
+# Below this many rows the single-pass engine is faster than dispatching work
+PARALLEL_ROW_THRESHOLD = 2_000_000
+
+# Row ranges per worker; more than one evens out uneven partitions
+PARTITIONS_PER_WORKER = 2
+
+# Integer columns spanning at most this many values are coded by offset
+MAX_INTEGER_SPAN = 100_000
+
+DEFAULT_WORKERS = int(os.environ.get('SALES_AGGREGATION_WORKERS', 0)) or os.cpu_count() or 1
+
+EXECUTORS = ('process', 'thread')
+
+_pools = {}
+
+def dimension_codes(series):
+    """Return integer codes for a column and the values they index
+
+    Categoricals reuse their codes and small-range integers are offset by
+    their minimum, so neither needs a hash pass; other columns are
+    factorized. Codes need not be sorted or dense.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        if len(codes) == 0 or codes.min() >= 0:
+            return codes, np.asarray(series.cat.categories)
+    elif pd.api.types.is_integer_dtype(series.dtype) and len(series):
+        low, high = int(series.min()), int(series.max())
+        if high - low < MAX_INTEGER_SPAN:
+            codes = (series.to_numpy() - low).astype(np.min_scalar_type(high - low))
+            return codes, np.arange(low, high + 1).astype(series.dtype)
+    codes, uniques = pd.factorize(series)
+    return codes, np.asarray(uniques)
+
+def partition_totals(columns, sizes, start, stop):
+    """Sum total_sales, quantity and row count per cell for rows [start, stop)
+
+    Returns the occupied cell ids and their totals.
+    """
+    cell_ids = np.zeros(stop - start, dtype=np.int64)
+    for dimension, size in zip(CELL_DIMENSIONS, sizes):
+        cell_ids = cell_ids * size + columns[dimension][start:stop]
+
+    n_cells = int(np.prod(sizes, dtype=np.int64))
+    row_count = np.bincount(cell_ids, minlength=n_cells)
+    occupied = np.flatnonzero(row_count)
+    total_sales = np.bincount(cell_ids, weights=columns['total_sales'][start:stop], minlength=n_cells)
+    quantity = np.bincount(cell_ids, weights=columns['quantity'][start:stop], minlength=n_cells)
+    return occupied, total_sales[occupied], quantity[occupied], row_count[occupied]
+
+def shared_partition_totals(spec, sizes, start, stop):
+    """Process-pool entry point: attach to the shared columns and sum one partition"""
+    handles = []
+    columns = {}
+    try:
+        for name, (shm_name, dtype, length) in spec.items():
+            handle = shared_memory.SharedMemory(name=shm_name)
+            handles.append(handle)
+            columns[name] = np.ndarray((length,), dtype=dtype, buffer=handle.buf)
+        return partition_totals(columns, sizes, start, stop)
+    finally:
+        columns.clear()
+        for handle in handles:
+            handle.close()
+
+class SharedColumns:
+    """Copies of numpy columns in named shared memory blocks, freed on exit"""
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.handles = []
+        self.spec = {}
+
+    def __enter__(self):
+        for name, values in self.columns.items():
+            values = np.ascontiguousarray(values)
+            handle = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            self.handles.append(handle)
+            np.ndarray(values.shape, dtype=values.dtype, buffer=handle.buf)[:] = values
+            self.spec[name] = (handle.name, values.dtype.str, len(values))
+        return self.spec
+
+    def __exit__(self, *exc):
+        for handle in self.handles:
+            handle.close()
+            handle.unlink()
+
+def get_pool(executor, workers):
+    """Return a long-lived worker pool, created on first use"""
+    key = (executor, workers)
+    if key not in _pools:
+        if executor == 'process':
+            # spawn rather than fork: the dashboard process runs server threads
+            _pools[key] = ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'))
+        else:
+            _pools[key] = ThreadPoolExecutor(max_workers=workers)
+    return _pools[key]
+
+@traced()
+def parallel_aggregates(df, workers=None, executor='process'):
+    """Aggregate a filtered frame into SalesAggregates across a worker pool
+
+    The frame is split into contiguous row ranges (date ranges, for frames
+    sorted by a FilterIndex). Each worker sums its range into per-cell
+    totals and the partials are merged with one bincount. Process workers
+    read the columns from shared memory, so the frame is never pickled.
+    """
+    if executor not in EXECUTORS:
+        raise ValueError(f"Unknown executor: {executor}")
+    workers = workers or DEFAULT_WORKERS
+
+    columns = {}
+    uniques = []
+    for dimension in CELL_DIMENSIONS:
+        columns[dimension], dimension_uniques = dimension_codes(df[dimension])
+        uniques.append(dimension_uniques)
+    sizes = [max(len(u), 1) for u in uniques]
+    n_cells = int(np.prod(sizes, dtype=np.int64))
+    if n_cells > MAX_DENSE_CELLS:
+        return compute_aggregates(df)
+
+    columns['total_sales'] = df['total_sales'].to_numpy(dtype=np.float64)
+    columns['quantity'] = df['quantity'].to_numpy()
+
+    bounds = np.linspace(0, len(df), workers * PARTITIONS_PER_WORKER + 1).astype(np.int64)
+    starts, stops = bounds[:-1].tolist(), bounds[1:].tolist()
+    pool = get_pool(executor, workers)
+    if executor == 'thread':
+        partials = list(pool.map(partition_totals, [columns] * len(starts), [sizes] * len(starts), starts, stops))
+    else:
+        with SharedColumns(columns) as spec:
+            partials = list(pool.map(
+                shared_partition_totals, [spec] * len(starts), [sizes] * len(starts), starts, stops
+            ))
+
+    cell_ids = np.concatenate([partial[0] for partial in partials])
+    merged = [
+        np.bincount(cell_ids, weights=np.concatenate([partial[i] for partial in partials]), minlength=n_cells)
+        for i in (1, 2, 3)
+    ]
+    occupied = np.flatnonzero(merged[2])
+    return decode_cells(occupied, uniques, sizes, *(totals[occupied] for totals in merged))
+
+def aggregate(df, workers=None, threshold=PARALLEL_ROW_THRESHOLD, executor='process'):
+    """Return SalesAggregates, in parallel once the frame passes the row threshold"""
+    workers = workers or DEFAULT_WORKERS
+    if workers <= 1 or len(df) < threshold:
+        return compute_aggregates(df)
+    return parallel_aggregates(df, workers, executor)
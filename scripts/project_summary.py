@@ -5,10 +5,13 @@ Validates all components of the Sales Analytics Dashboard project
 """
 
 import os
-import pandas as pd
-import sqlite3
 from pathlib import Path
 import sys
+from analytics import analyze
+from validation import default_checks, print_report, validate
+
+CLEAN_DATA = 'data/clean_sales_data.csv'
+DATABASE = 'data/sales.db'
 
 def print_header(title):
     """Print a formatted header"""
@@ -24,14 +27,19 @@ def check_file_exists(filepath, description):
     return exists
 
 def check_data_pipeline():
-    """Check the data pipeline components"""
+    """Check the data pipeline components
+
+    The cleaned data is validated in one streaming pass (schema, nulls,
+    value ranges, totals, dates and row-count parity with the database).
+    Returns (passed, report); report is None when a data file is missing.
+    """
     print_header("📊 DATA PIPELINE VALIDATION")
     
     # Check data files
     data_files = {
         'data/sales_data.csv': 'Raw sales data (generated)',
-        'data/clean_sales_data.csv': 'Cleaned sales data',
-        'data/sales.db': 'SQLite database'
+        CLEAN_DATA: 'Cleaned sales data',
+        DATABASE: 'SQLite database'
     }
     
     all_data_exists = True
@@ -40,43 +48,23 @@ def check_data_pipeline():
             all_data_exists = False
     
     # Check data content
-    if all_data_exists:
-        try:
-            df = pd.read_csv('data/clean_sales_data.csv')
-            print(f"✅ Data loaded successfully: {len(df):,} records")
-            
-            # Check database
-            conn = sqlite3.connect('data/sales.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM sales")
-            db_count = cursor.fetchone()[0]
-            conn.close()
-            print(f"✅ Database verified: {db_count:,} records in SQLite")
-            
-            # Basic data validation
-            required_columns = ['date', 'product', 'region', 'total_sales', 'quantity', 'unit_price']
-            missing_cols = [col for col in required_columns if col not in df.columns]
-            
-            if not missing_cols:
-                print("✅ All required columns present")
-                
-                # Data quality checks
-                revenue = df['total_sales'].sum()
-                print(f"✅ Total revenue: ${revenue:,.0f}")
-                
-                date_range = f"{df['date'].min()} to {df['date'].max()}"
-                print(f"✅ Date range: {date_range}")
-                
-                products = df['product'].nunique()
-                regions = df['region'].nunique()
-                print(f"✅ Data diversity: {products} products, {regions} regions")
-            else:
-                print(f"❌ Missing columns: {missing_cols}")
-                
-        except Exception as e:
-            print(f"❌ Data validation error: {str(e)}")
+    if not all_data_exists:
+        return False, None
+    try:
+        report = validate(CLEAN_DATA, default_checks(DATABASE))
+    except Exception as e:
+        print(f"❌ Data validation error: {str(e)}")
+        return False, None
+    print_report(report)
+    
+    if report.passed:
+        revenue = report.result('range(total_sales)').stats['sum']
+        print(f"✅ Total revenue: ${revenue:,.0f}")
+        products = report.result('distinct(product)').stats['distinct']
+        regions = report.result('distinct(region)').stats['distinct']
+        print(f"✅ Data diversity: {products} products, {regions} regions")
     
-    return all_data_exists
+    return report.passed, report
 
 def check_scripts():
     """Check all Python scripts"""
@@ -86,6 +74,7 @@ def check_scripts():
         'scripts/generate_data.py': 'Data generation script',
         'scripts/clean_data.py': 'Data cleaning script',
         'scripts/load_to_sql.py': 'Database loading script',
+        'scripts/validation.py': 'Data validation checks',
         'scripts/utils.py': 'Utility functions',
         'scripts/streamlit_dashboard.py': 'Streamlit dashboard'
     }
@@ -184,16 +173,20 @@ def check_configuration():
     
     return all_config_exists
 
-def run_dashboard_tests():
-    """Test dashboard functionality"""
+def run_dashboard_tests(report=None):
+    """Test dashboard functionality
+
+    Data loading is covered by the pipeline validation report rather than
+    by reading the data again.
+    """
     print_header("🚀 DASHBOARD FUNCTIONALITY TESTS")
     
+    if report is None or not report.passed:
+        print("❌ Data loading: cleaned data did not pass validation")
+        return False
+    print(f"✅ Data loading: {report.rows:,} validated records")
+    
     try:
-        # Test data loading capability
-        import pandas as pd
-        df = pd.read_csv('data/clean_sales_data.csv')
-        print("✅ Data loading: Successful")
-        
         # Test basic visualizations
         import matplotlib.pyplot as plt
         import seaborn as sns
@@ -243,22 +236,21 @@ def print_project_summary():
     
     print("📈 KEY INSIGHTS (Sample Data):")
     try:
-        df = pd.read_csv('data/clean_sales_data.csv')
-        total_revenue = df['total_sales'].sum()
-        total_transactions = len(df)
-        avg_order = df['total_sales'].mean()
+        # The database answers from its rollups without re-reading the cleaned file
+        insights = analyze(DATABASE if os.path.exists(DATABASE) else CLEAN_DATA)
+        kpis = insights.kpis
         
-        print(f"   💰 Total Revenue: ${total_revenue:,.0f}")
-        print(f"   📋 Transactions: {total_transactions:,}")
-        print(f"   📊 Avg Order Value: ${avg_order:.0f}")
+        print(f"   💰 Total Revenue: ${kpis.total_revenue:,.0f}")
+        print(f"   📋 Transactions: {kpis.total_transactions:,}")
+        print(f"   📊 Avg Order Value: ${kpis.avg_order_value:.0f}")
         
         # Top product
-        top_product = df.groupby('product')['total_sales'].sum().sort_values(ascending=False)
-        print(f"   🏆 Top Product: {top_product.index[0]} (${top_product.iloc[0]:,.0f})")
+        top_product = insights.top_product
+        print(f"   🏆 Top Product: {top_product.name} (${top_product.total_sales:,.0f})")
         
         # Top region
-        top_region = df.groupby('region')['total_sales'].sum().sort_values(ascending=False)
-        print(f"   🌍 Top Region: {top_region.index[0]} (${top_region.iloc[0]:,.0f})")
+        top_region = insights.top_region
+        print(f"   🌍 Top Region: {top_region.name} (${top_region.total_sales:,.0f})")
         
     except:
         print("   ⚠️  Unable to load sample insights")
@@ -269,15 +261,16 @@ def main():
     print("=" * 60)
     
     # Run all validation checks
+    data_passed, report = check_data_pipeline()
     checks = [
-        check_data_pipeline(),
+        data_passed,
         check_scripts(),
         check_notebooks(),
         check_powerbi_guides(),
         check_reports(),
         check_assets(),
         check_configuration(),
-        run_dashboard_tests()
+        run_dashboard_tests(report)
     ]
     
     # Calculate success rate
@@ -0,0 +1,509 @@
+"""
+Dashboard Query Backends
+Filter and aggregation queries over an in-memory frame or the SQLite database
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+import pandas as pd
+from aggregations import CELL_DIMENSIONS, aggregates_from_cells
+from filter_index import FilterIndex
+from parallel_aggregation import aggregate
+from topk_index import TOPK_DIMENSIONS, TOPK_TABLE, bucket_selection, leaderboard_frame, month_bucket
+from downsampling import bin_budget, bins_to_frame, density_bins
+from trends import TREND_MEASURES, daily_totals
+from instrumentation import traced
+
+# Dimensions the dashboard groups total_sales by
+DIMENSIONS = ['month', 'product', 'region', 'year', 'salesperson']
+
+# Sidebar filter keys and the columns they apply to
+FILTER_COLUMNS = {'products': 'product', 'regions': 'region', 'years': 'year'}
+
+SAMPLE_COLUMNS = ['unit_price', 'quantity', 'total_sales', 'product', 'region']
+
+# Fixed seed so samples are identical across reruns and sessions
+SAMPLE_SEED = 42
+
+# Columns of the rollup cube materialized by load_to_sql
+CUBE_TABLE = 'sales_cube'
+CUBE_COLUMNS = {'date', 'product', 'region', 'salesperson', 'month', 'year'}
+
+# Idle connections an SQLiteBackend keeps open between queries
+MAX_IDLE_CONNECTIONS = 4
+
+def active_values(filters, key):
+    """Return the selected values for a multiselect filter, or None for all"""
+    values = filters.get(key, [])
+    if 'All' in values or len(values) == 0:
+        return None
+    return list(values)
+
+def date_bounds(filters):
+    """Return the (start, end) timestamps of the date filter, or None"""
+    date_range = filters.get('date_range', ())
+    if len(date_range) != 2:
+        return None
+    return pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1])
+
+def filter_key(filters):
+    """Return a hashable, order-independent key for the filter state
+
+    'All' and empty selections normalize to None, so equivalent widget
+    states share a key.
+    """
+    bounds = date_bounds(filters)
+    dates = None if bounds is None else tuple(b.strftime('%Y-%m-%d') for b in bounds)
+    selections = []
+    for key in FILTER_COLUMNS:
+        values = active_values(filters, key)
+        selections.append(None if values is None else tuple(sorted(values)))
+    return (dates, *selections)
+
+def apply_filters(df, filters):
+    """Apply selected filters to dataframe"""
+    filtered_df = df.copy()
+
+    # Apply date filter
+    bounds = date_bounds(filters)
+    if bounds is not None:
+        start_date, end_date = bounds
+        filtered_df = filtered_df[
+            (filtered_df['date'] >= start_date) &
+            (filtered_df['date'] <= end_date)
+        ]
+
+    # Apply product, region and year filters
+    for key, column in FILTER_COLUMNS.items():
+        values = active_values(filters, key)
+        if values is not None:
+            filtered_df = filtered_df[filtered_df[column].isin(values)]
+
+    return filtered_df
+
+def index_selections(filters):
+    """Map the sidebar filters to FilterIndex column selections"""
+    return {column: active_values(filters, key) for key, column in FILTER_COLUMNS.items()}
+
+def bucket_filters(filters):
+    """Return (date bounds, years) if no filter other than date and year is active, else None"""
+    for key in FILTER_COLUMNS:
+        if key != 'years' and active_values(filters, key) is not None:
+            return None
+    return date_bounds(filters), active_values(filters, 'years')
+
+def order_groups(data, dimension, order='key', limit=None):
+    """Sort a grouped [dimension, total_sales] frame and apply a row limit"""
+    if order == 'desc':
+        data = data.sort_values('total_sales', ascending=False)
+    else:
+        data = data.sort_values(dimension)
+    if limit is not None:
+        data = data.head(limit)
+    return data.reset_index(drop=True)
+
+class DataFrameBackend:
+    """Answer dashboard queries from an in-memory DataFrame
+
+    Filters are resolved through a FilterIndex, built on first use unless
+    one is passed in, so a filter change costs a bitmap intersection and a
+    row take rather than a full copy and one boolean mask per filter.
+    """
+
+    def __init__(self, df, index=None, topk=None):
+        self.df = df
+        self.index = index
+        self.topk = topk
+        self._filtered_key = None
+        self._filtered = None
+        self._aggregates = None
+
+    def filter_options(self):
+        """Return the values offered by the sidebar filters"""
+        return {
+            'min_date': self.df['date'].min().date(),
+            'max_date': self.df['date'].max().date(),
+            'products': sorted(self.df['product'].unique().tolist()),
+            'regions': sorted(self.df['region'].unique().tolist()),
+            'years': sorted(self.df['year'].unique().tolist()),
+        }
+
+    def total_rows(self):
+        """Return the unfiltered row count"""
+        return len(self.df)
+
+    @traced()
+    def filtered(self, filters):
+        """Return the filtered frame, reusing it across calls for the same filters"""
+        key = filter_key(filters)
+        if key != self._filtered_key:
+            if self.index is None:
+                self.index = FilterIndex(self.df)
+            self._filtered = self.index.apply(date_bounds(filters), index_selections(filters))
+            self._filtered_key = key
+            self._aggregates = None
+        return self._filtered
+
+    @traced()
+    def aggregates(self, filters):
+        """Return the shared SalesAggregates for the filter state
+
+        Large filtered frames are aggregated across a worker pool.
+        """
+        df = self.filtered(filters)
+        if self._aggregates is None:
+            self._aggregates = aggregate(df)
+        return self._aggregates
+
+    @traced()
+    def count(self, filters):
+        """Return the filtered row count"""
+        return len(self.filtered(filters))
+
+    @traced()
+    def kpis(self, filters):
+        """Return total revenue, transactions, average order value and quantity"""
+        df = self.filtered(filters)
+        return {
+            'total_revenue': df['total_sales'].sum(),
+            'total_transactions': len(df),
+            'avg_order_value': df['total_sales'].mean(),
+            'total_quantity': df['quantity'].sum(),
+        }
+
+    @traced()
+    def sales_by(self, dimension, filters, order='key', limit=None):
+        """Return total_sales grouped by one dimension"""
+        data = self.filtered(filters).groupby(dimension, observed=True)['total_sales'].sum().reset_index()
+        return order_groups(data, dimension, order, limit)
+
+    def top(self, dimension, filters, k):
+        """Return the top-k [dimension, total_sales] frame from the top-K index
+
+        Returns None when there is no index or the filters are not whole
+        months and years, so the caller falls back to the aggregates.
+        """
+        selection = bucket_filters(filters)
+        if self.topk is None or selection is None:
+            return None
+        return self.topk.top(dimension, k, *selection)
+
+    def sample(self, filters, n):
+        """Return a deterministic random sample of rows"""
+        df = self.filtered(filters)
+        return df.sample(n=min(n, len(df)), random_state=SAMPLE_SEED)[SAMPLE_COLUMNS]
+
+    @traced()
+    def scatter_bins(self, filters, x, y, weight=None, bins=None):
+        """Return density bins of the filtered rows for a scatter plot"""
+        return density_bins(self.filtered(filters), x, y, weight, bins)
+
+    @traced()
+    def daily_totals(self, filters):
+        """Return total_sales, quantity and row count per day"""
+        return daily_totals(self.filtered(filters))
+
+    @traced()
+    def rows(self, filters):
+        """Return the filtered rows"""
+        return self.filtered(filters)
+
+    @traced()
+    def page(self, filters, offset, limit):
+        """Return one page of the filtered rows"""
+        return self.filtered(filters).iloc[offset:offset + limit]
+
+    def iter_rows(self, filters, chunk_size):
+        """Yield the filtered rows in chunks of at most chunk_size"""
+        df = self.filtered(filters)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+
+class SQLiteBackend:
+    """Push dashboard filters and aggregations down to the SQLite database
+
+    Only aggregated results (and explicitly requested rows) are pulled into
+    pandas, so the dataset does not need to fit in memory. KPIs, counts and
+    group sums are answered from the rollup cube when it exists and every
+    active filter is on a cube column; samples and raw rows always read the
+    fact table.
+    """
+
+    def __init__(self, database_path, table='sales'):
+        self.database_path = database_path
+        self.table = table
+        self.idle = []
+        self.lock = threading.Lock()
+        self.closed = False
+        self.has_cube = self.fetchone(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (CUBE_TABLE,)
+        ) is not None
+        self.has_topk = self.fetchone(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (TOPK_TABLE,)
+        ) is not None
+
+    @contextmanager
+    def connection(self):
+        """Check out a read-only connection for the duration of one query
+
+        Concurrent queries each get their own connection, so sessions and
+        download threads sharing this backend do not wait on each other.
+        Connections move between threads but are used by one at a time.
+        """
+        with self.lock:
+            conn = self.idle.pop() if self.idle else None
+        if conn is None:
+            conn = sqlite3.connect(f'file:{self.database_path}?mode=ro', uri=True, check_same_thread=False)
+        try:
+            yield conn
+        finally:
+            with self.lock:
+                keep = not self.closed and len(self.idle) < MAX_IDLE_CONNECTIONS
+                if keep:
+                    self.idle.append(conn)
+            if not keep:
+                conn.close()
+
+    def close(self):
+        """Close the idle connections; checked-out ones close when returned"""
+        with self.lock:
+            self.closed = True
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+    def fetchone(self, sql, params=()):
+        """Run a query and return its first row"""
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def fetchall(self, sql, params=()):
+        """Run a query and return all of its rows"""
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def use_cube(self, filters, dimension=None):
+        """Return True if the query can be answered from the rollup cube"""
+        if not self.has_cube:
+            return False
+        columns = {FILTER_COLUMNS[key] for key in FILTER_COLUMNS if active_values(filters, key) is not None}
+        if date_bounds(filters) is not None:
+            columns.add('date')
+        if dimension is not None:
+            columns.add(dimension)
+        return columns <= CUBE_COLUMNS
+
+    def query(self, sql, params=()):
+        """Run a query and return the result as a DataFrame"""
+        with self.connection() as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def where(self, filters):
+        """Compile the sidebar filters to a WHERE clause and parameters"""
+        clauses = []
+        params = []
+
+        bounds = date_bounds(filters)
+        if bounds is not None:
+            clauses.append('date BETWEEN ? AND ?')
+            params += [bounds[0].strftime('%Y-%m-%d'), bounds[1].strftime('%Y-%m-%d')]
+
+        for key, column in FILTER_COLUMNS.items():
+            values = active_values(filters, key)
+            if values is not None:
+                clauses.append(f"{column} IN ({', '.join('?' for _ in values)})")
+                params += [int(v) if column == 'year' else str(v) for v in values]
+
+        sql = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        return sql, params
+
+    def filter_options(self):
+        """Return the values offered by the sidebar filters"""
+        source = CUBE_TABLE if self.has_cube else self.table
+        min_date, max_date = self.fetchone(f"SELECT MIN(date), MAX(date) FROM {source}")
+
+        def distinct(column):
+            rows = self.fetchall(f"SELECT DISTINCT {column} FROM {source} ORDER BY {column}")
+            return [value for (value,) in rows]
+
+        return {
+            'min_date': pd.to_datetime(min_date).date(),
+            'max_date': pd.to_datetime(max_date).date(),
+            'products': distinct('product'),
+            'regions': distinct('region'),
+            'years': distinct('year'),
+        }
+
+    def total_rows(self):
+        """Return the unfiltered row count"""
+        return self.count({})
+
+    @traced()
+    def count(self, filters):
+        """Return the filtered row count"""
+        where, params = self.where(filters)
+        if self.use_cube(filters):
+            sql = f"SELECT COALESCE(SUM(row_count), 0) FROM {CUBE_TABLE}{where}"
+        else:
+            sql = f"SELECT COUNT(*) FROM {self.table}{where}"
+        return self.fetchone(sql, params)[0]
+
+    @traced()
+    def kpis(self, filters):
+        """Return total revenue, transactions, average order value and quantity"""
+        where, params = self.where(filters)
+        if self.use_cube(filters):
+            sql = (f"SELECT SUM(total_sales), COALESCE(SUM(row_count), 0), SUM(total_sales) / SUM(row_count), "
+                   f"SUM(quantity) FROM {CUBE_TABLE}{where}")
+        else:
+            sql = f"SELECT SUM(total_sales), COUNT(*), AVG(total_sales), SUM(quantity) FROM {self.table}{where}"
+        total_revenue, total_transactions, avg_order_value, total_quantity = self.fetchone(sql, params)
+        return {
+            'total_revenue': total_revenue or 0,
+            'total_transactions': total_transactions,
+            'avg_order_value': avg_order_value,
+            'total_quantity': total_quantity or 0,
+        }
+
+    @traced()
+    def sales_by(self, dimension, filters, order='key', limit=None):
+        """Return total_sales grouped by one dimension"""
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension: {dimension}")
+        where, params = self.where(filters)
+        source = CUBE_TABLE if self.use_cube(filters, dimension) else self.table
+        order_by = 'total_sales DESC' if order == 'desc' else dimension
+        sql = (f"SELECT {dimension}, SUM(total_sales) AS total_sales FROM {source}{where} "
+               f"GROUP BY {dimension} ORDER BY {order_by}")
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return self.query(sql, params)
+
+    @traced()
+    def aggregates(self, filters):
+        """Return the shared SalesAggregates for the filter state in one GROUP BY"""
+        where, params = self.where(filters)
+        dimensions = ', '.join(CELL_DIMENSIONS)
+        if self.use_cube(filters, 'salesperson'):
+            sql = (f"SELECT {dimensions}, SUM(total_sales), SUM(quantity), SUM(row_count) "
+                   f"FROM {CUBE_TABLE}{where} GROUP BY {dimensions}")
+        else:
+            sql = (f"SELECT {dimensions}, SUM(total_sales), SUM(quantity), COUNT(*) "
+                   f"FROM {self.table}{where} GROUP BY {dimensions}")
+        return aggregates_from_cells(self.fetchall(sql, params))
+
+    @traced()
+    def top(self, dimension, filters, k):
+        """Return the top-k [dimension, total_sales] frame from the top-K table
+
+        One GROUP BY over the selected months' rows of sales_topk, which
+        has one row per month and value instead of one per sale. Returns
+        None when the table is missing or the filters are not whole months
+        and years.
+        """
+        selection = bucket_filters(filters)
+        if not self.has_topk or dimension not in TOPK_DIMENSIONS or selection is None:
+            return None
+        # Separate MIN and MAX subqueries are each one index seek; combined they scan
+        source = CUBE_TABLE if self.has_cube else self.table
+        first_date, last_date = self.fetchone(
+            f"SELECT (SELECT MIN(date) FROM {source}), (SELECT MAX(date) FROM {source})"
+        )
+        if first_date is None:
+            return leaderboard_frame(dimension, [])
+        first, last = pd.Timestamp(first_date), pd.Timestamp(last_date)
+        buckets = range(month_bucket(first.year, first.month), month_bucket(last.year, last.month) + 1)
+        selected = bucket_selection(*selection, buckets, first_date, last_date)
+        if selected is None:
+            return None
+
+        where, params = "WHERE dimension = ?", [dimension]
+        if len(selected) < len(buckets):
+            where += f" AND bucket IN ({', '.join('?' for _ in selected)})"
+            params += selected
+        pairs = self.fetchall(
+            f"SELECT key, SUM(total_sales) AS total FROM {TOPK_TABLE} {where} "
+            "GROUP BY key ORDER BY total DESC LIMIT ?",
+            params + [int(k)]
+        )
+        return leaderboard_frame(dimension, pairs)
+
+    @traced()
+    def daily_totals(self, filters):
+        """Return total_sales, quantity and row count per day"""
+        where, params = self.where(filters)
+        if self.use_cube(filters, 'date'):
+            sql = (f"SELECT date, SUM(total_sales), SUM(quantity), SUM(row_count) "
+                   f"FROM {CUBE_TABLE}{where} GROUP BY date ORDER BY date")
+        else:
+            sql = (f"SELECT date, SUM(total_sales), SUM(quantity), COUNT(*) "
+                   f"FROM {self.table}{where} GROUP BY date ORDER BY date")
+        daily = pd.DataFrame(self.fetchall(sql, params), columns=['date'] + TREND_MEASURES)
+        daily['date'] = pd.to_datetime(daily['date'])
+        return daily.set_index('date')
+
+    def sample(self, filters, n):
+        """Return a deterministic pseudo-random sample of rows
+
+        Rows are ordered by a multiplicative hash of their rowid, which is
+        stable across reruns unlike ORDER BY RANDOM().
+        """
+        where, params = self.where(filters)
+        return self.query(
+            f"SELECT {', '.join(SAMPLE_COLUMNS)} FROM {self.table}{where} "
+            f"ORDER BY (rowid * 2654435761 + {SAMPLE_SEED}) % 4294967296 LIMIT ?",
+            params + [int(n)]
+        )
+
+    @traced()
+    def scatter_bins(self, filters, x, y, weight=None, bins=None):
+        """Return density bins of the filtered rows, binned in the database"""
+        nx, ny = bin_budget() if bins is None else bins
+        where, params = self.where(filters)
+        x_lo, x_hi, y_lo, y_hi = self.fetchone(
+            f"SELECT MIN({x}), MAX({x}), MIN({y}), MAX({y}) FROM {self.table}{where}", params
+        )
+        if x_lo is None:
+            return bins_to_frame([], [], [], [], ((0, 0), (0, 0)), (nx, ny), x, y, weight)
+
+        x_scale = nx / (x_hi - x_lo) if x_hi > x_lo else 0.0
+        y_scale = ny / (y_hi - y_lo) if y_hi > y_lo else 0.0
+        weight_sum = f"SUM({weight})" if weight is not None else "NULL"
+        rows = self.fetchall(
+            f"SELECT MIN(CAST(({x} - ?) * ? AS INTEGER), ?) AS ix, "
+            f"MIN(CAST(({y} - ?) * ? AS INTEGER), ?) AS iy, COUNT(*), {weight_sum} "
+            f"FROM {self.table}{where} GROUP BY ix, iy",
+            [x_lo, x_scale, nx - 1, y_lo, y_scale, ny - 1] + params
+        )
+        ix, iy, counts, weight_sums = zip(*rows)
+        return bins_to_frame(ix, iy, counts, weight_sums, ((x_lo, x_hi), (y_lo, y_hi)), (nx, ny), x, y, weight)
+
+    @traced()
+    def rows(self, filters):
+        """Return the filtered rows"""
+        where, params = self.where(filters)
+        df = self.query(f"SELECT * FROM {self.table}{where}", params)
+        df['date'] = pd.to_datetime(df['date'])
+        return df
+
+    @traced()
+    def page(self, filters, offset, limit):
+        """Return one page of the filtered rows, in rowid order"""
+        where, params = self.where(filters)
+        df = self.query(
+            f"SELECT * FROM {self.table}{where} ORDER BY rowid LIMIT ? OFFSET ?",
+            params + [int(limit), int(offset)]
+        )
+        df['date'] = pd.to_datetime(df['date'])
+        return df
+
+    def iter_rows(self, filters, chunk_size):
+        """Yield the filtered rows in chunks of at most chunk_size"""
+        where, params = self.where(filters)
+        # The connection stays checked out until the generator is exhausted or closed
+        with self.connection() as conn:
+            chunks = pd.read_sql_query(f"SELECT * FROM {self.table}{where}", conn, params=params, chunksize=chunk_size)
+            for df in chunks:
+                df['date'] = pd.to_datetime(df['date'])
+                yield df
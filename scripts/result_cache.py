@@ -0,0 +1,187 @@
+"""
+Result Cache
+Bounded LRU/TTL cache for dashboard results, shared across Streamlit sessions
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+import plotly.graph_objects as go
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_TTL_SECONDS = 15 * 60
+
+def data_version(path):
+    """Return a token that changes whenever the data file or dataset is rewritten
+
+    Covers a single file (plus its SQLite WAL file) or every file under a
+    Parquet dataset directory.
+    """
+    if os.path.isdir(path):
+        paths = [os.path.join(root, name) for root, _, names in os.walk(path) for name in names]
+    else:
+        paths = [path, f'{path}-wal']
+
+    # A stable digest rather than hash(), which is salted per process, so
+    # every process (and every restart) derives the same version and ETags
+    stamps = []
+    for file_path in sorted(paths):
+        if os.path.exists(file_path):
+            stat = os.stat(file_path)
+            stamps.append((os.path.relpath(file_path, os.path.dirname(path)), stat.st_mtime_ns, stat.st_size))
+    return hashlib.sha1(repr(stamps).encode()).hexdigest()
+
+class ResultCache:
+    """Thread-safe LRU cache with a time-to-live and hit/miss counters
+
+    Keys are (namespace, data version, filter key, name) tuples. When the
+    data version of a namespace changes, its older entries are dropped.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._pending = {}
+        self._failures = {}
+        self._lock = threading.Lock()
+        self._thread = threading.local()
+
+    def sync_version(self, namespace, version):
+        """Drop the namespace's entries if its data version has changed"""
+        with self._lock:
+            if self._versions.get(namespace) == version:
+                return
+            self._versions[namespace] = version
+            stale = [key for key in self._entries if key[0] == namespace and key[1] != version]
+            for key in stale:
+                del self._entries[key]
+            self.evictions += len(stale)
+
+    def get(self, key, compute):
+        """Return the cached value for key, computing and storing it on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self._count('hits')
+                return entry[1]
+            self.misses += 1
+        self._count('misses')
+
+        # Compute outside the lock so other sessions are not blocked
+        value = compute()
+
+        with self._lock:
+            self._entries[key] = (now, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def peek(self, key, default=None):
+        """Return the cached value for key without computing it on a miss
+
+        Only hits are counted; a following get() records the miss.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now - entry[0] > self.ttl_seconds:
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+        self._count('hits')
+        return entry[1]
+
+    def contains(self, key):
+        """Return True if a fresh value is cached for key, without counting a lookup"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds
+
+    @contextmanager
+    def count_lookups(self):
+        """Count the hits and misses of lookups made on this thread inside the block
+
+        Yields a dict of 'hits' and 'misses' updated as lookups happen, so a
+        Streamlit rerun (one thread per session) sees only its own lookups,
+        unlike the process-wide counters in stats().
+        """
+        previous = getattr(self._thread, 'counts', None)
+        counts = {'hits': 0, 'misses': 0}
+        self._thread.counts = counts
+        try:
+            yield counts
+        finally:
+            self._thread.counts = previous
+
+    def _count(self, name):
+        """Add one lookup to the counts of this thread's count_lookups() block"""
+        counts = getattr(self._thread, 'counts', None)
+        if counts is not None:
+            counts[name] += 1
+
+    def compute_in_background(self, key, compute, executor):
+        """Start computing key's value on executor unless it is cached or in flight
+
+        The result is stored like a get() miss, so later lookups find it.
+        If compute raises, the exception is kept for background_error()
+        until the key is submitted again.
+        """
+        if self.contains(key):
+            return
+        with self._lock:
+            if key in self._pending:
+                return
+            self._failures.pop(key, None)
+            future = executor.submit(self.get, key, compute)
+            self._pending[key] = future
+
+        def finished(done):
+            with self._lock:
+                self._pending.pop(key, None)
+                if not done.cancelled() and done.exception() is not None:
+                    self._failures[key] = done.exception()
+        future.add_done_callback(finished)
+
+    def background_error(self, key):
+        """Return the exception of key's last failed background computation, or None"""
+        with self._lock:
+            return self._failures.get(key)
+
+    def figure(self, key, build):
+        """Return a Plotly figure rebuilt from its cached JSON"""
+        figure_json = self.get(key, lambda: build().to_json())
+        # The JSON came from a validated figure, so skip re-validation
+        return go.Figure(json.loads(figure_json), _validate=False)
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._failures.clear()
+
+    def stats(self):
+        """Return hit/miss/eviction counters and the current entry count"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
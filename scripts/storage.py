@@ -0,0 +1,490 @@
+"""
+Columnar Storage
+Typed Parquet datasets, partitioned by year/month, for the sales pipeline,
+and a memory-mapped column store for the dashboard
+"""
+
+import json
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from instrumentation import traced
+
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+
+# Raw generated data; year/month are only stored as partition keys
+RAW_SCHEMA = pa.schema([
+    ('date', pa.date32()),
+    ('product', CATEGORY),
+    ('region', CATEGORY),
+    ('salesperson', CATEGORY),
+    ('quantity', pa.int32()),
+    ('unit_price', pa.float64()),
+    ('total_sales', pa.float64()),
+    ('year', pa.int16()),
+    ('month', pa.int8()),
+])
+
+# Cleaned data with derived features
+CLEAN_SCHEMA = pa.schema([
+    ('date', pa.date32()),
+    ('product', CATEGORY),
+    ('region', CATEGORY),
+    ('salesperson', CATEGORY),
+    ('quantity', pa.int32()),
+    ('unit_price', pa.float64()),
+    ('total_sales', pa.float64()),
+    ('quarter', pa.int8()),
+    ('year', pa.int16()),
+    ('month', pa.int8()),
+])
+
+PARTITIONING = ds.partitioning(
+    pa.schema([('year', pa.int16()), ('month', pa.int8())]), flavor='hive'
+)
+
+RAW_COLUMNS = ['date', 'product', 'region', 'salesperson', 'quantity', 'unit_price', 'total_sales']
+
+# In-memory dtype kinds for compact frames: categories, integers downcast to
+# the narrowest width that holds the loaded values, and floats at a
+# configurable width
+COMPACT_DTYPES = {
+    'date': 'datetime',
+    'product': 'category',
+    'region': 'category',
+    'salesperson': 'category',
+    'quantity': 'integer',
+    'unit_price': 'float',
+    'total_sales': 'float',
+    'quarter': 'integer',
+    'year': 'integer',
+    'month': 'integer',
+}
+
+# float32 halves the float columns but keeps only ~7 significant digits
+DEFAULT_FLOAT_DTYPE = 'float64'
+
+# Column store: a directory of one .npy file per column, a JSON dictionary
+# per categorical column, and a manifest, with rows sorted by date
+COLUMN_STORE_SUFFIX = '.columns'
+COLUMN_STORE_MANIFEST = 'manifest.json'
+
+def is_column_store_path(path):
+    """Return True if the path names a memory-mapped column store"""
+    return str(path).rstrip('/').endswith(COLUMN_STORE_SUFFIX)
+
+def is_parquet_path(path):
+    """Return True if the path names a Parquet dataset rather than a CSV file"""
+    return path.endswith('.parquet') or (os.path.isdir(path) and not is_column_store_path(path))
+
+def to_arrow_table(df, schema):
+    """Convert a DataFrame to an Arrow table with the given typed schema"""
+    df = df.copy()
+    df['date'] = pd.to_datetime(df['date'])
+    if 'year' not in df.columns:
+        df['year'] = df['date'].dt.year
+    if 'month' not in df.columns:
+        df['month'] = df['date'].dt.month
+    return pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+
+def write_parquet(chunks, path, schema, basename_template='part-{i}.parquet', overwrite=True):
+    """Write DataFrame chunks to a year/month partitioned Parquet dataset
+
+    chunks may be a single DataFrame or any iterable of DataFrames; batches
+    are streamed to disk so only one chunk is held in memory at a time.
+    """
+    if isinstance(chunks, pd.DataFrame):
+        chunks = [chunks]
+    if overwrite and os.path.isdir(path):
+        shutil.rmtree(path)
+
+    rows_written = 0
+
+    def batches():
+        nonlocal rows_written
+        for chunk in chunks:
+            rows_written += len(chunk)
+            yield from to_arrow_table(chunk, schema).to_batches()
+
+    ds.write_dataset(
+        batches(),
+        path,
+        schema=schema,
+        format='parquet',
+        partitioning=PARTITIONING,
+        basename_template=basename_template,
+        existing_data_behavior='overwrite_or_ignore',
+    )
+    return rows_written
+
+def open_dataset(path, schema=None):
+    """Open a partitioned Parquet dataset"""
+    return ds.dataset(path, schema=schema, format='parquet', partitioning=PARTITIONING)
+
+def date_range_filter(date_range):
+    """Build a row filter for a (start, end) date range with partition pruning
+
+    The year/month terms let Arrow skip whole partition directories; the
+    date terms filter the remaining rows and row groups. Either end may be
+    None to leave that side open.
+    """
+    start, end = date_range
+    year = ds.field('year')
+    month = ds.field('month')
+    date = ds.field('date')
+
+    terms = []
+    if start is not None:
+        start = pd.Timestamp(start)
+        terms.append((year > start.year) | ((year == start.year) & (month >= start.month)))
+        terms.append(date >= pa.scalar(start.date(), pa.date32()))
+    if end is not None:
+        end = pd.Timestamp(end)
+        terms.append((year < end.year) | ((year == end.year) & (month <= end.month)))
+        terms.append(date <= pa.scalar(end.date(), pa.date32()))
+    if not terms:
+        return None
+    row_filter = terms[0]
+    for term in terms[1:]:
+        row_filter &= term
+    return row_filter
+
+def read_parquet(path, columns=None, date_range=None, schema=None):
+    """Read a Parquet dataset into pandas with column projection and date pruning"""
+    dataset = open_dataset(path, schema)
+    row_filter = date_range_filter(date_range) if date_range is not None else None
+    table = dataset.to_table(columns=columns, filter=row_filter)
+    return table.to_pandas(date_as_object=False)
+
+def iter_parquet(path, columns=None, batch_size=1_000_000, schema=None, date_range=None):
+    """Yield a Parquet dataset as pandas chunks of at most batch_size rows
+
+    A (start, end) date_range, either end possibly None, is pushed down to
+    the scan, so partitions outside it are never read. Small record batches
+    (one per file or row group) are combined, so chunks hold batch_size
+    rows except the last.
+    """
+    dataset = open_dataset(path, schema)
+    row_filter = date_range_filter(date_range) if date_range is not None else None
+    pending = []
+    pending_rows = 0
+    for batch in dataset.to_batches(columns=columns, batch_size=batch_size, filter=row_filter):
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= batch_size:
+            table = pa.Table.from_batches(pending)
+            yield table.slice(0, batch_size).to_pandas(date_as_object=False)
+            rest = table.slice(batch_size)
+            pending = rest.to_batches()
+            pending_rows = rest.num_rows
+    if pending_rows:
+        yield pa.Table.from_batches(pending).to_pandas(date_as_object=False)
+
+def count_rows(path):
+    """Return the row count of a Parquet dataset from its metadata"""
+    return open_dataset(path).count_rows()
+
+def integer_range_dtype(low, high):
+    """Return the narrowest signed integer dtype holding every value in [low, high]"""
+    for dtype in (np.int8, np.int16, np.int32, np.int64):
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return None
+
+def narrowest_integer_dtype(series):
+    """Return the narrowest signed integer dtype holding an integer series, or None"""
+    if not pd.api.types.is_integer_dtype(series.dtype) or len(series) == 0:
+        return None
+    return integer_range_dtype(int(series.min()), int(series.max()))
+
+@traced()
+def compact_frame(df, float_dtype=DEFAULT_FLOAT_DTYPE):
+    """Return df with the compact in-memory dtypes from COMPACT_DTYPES
+
+    Columns without an entry, or already of their compact kind, are kept
+    as they are without copying.
+    """
+    compact = {}
+    for column in df.columns:
+        kind = COMPACT_DTYPES.get(column)
+        series = df[column]
+        if kind == 'datetime' and not pd.api.types.is_datetime64_any_dtype(series.dtype):
+            series = pd.to_datetime(series)
+        elif kind == 'category' and not isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype('category')
+        elif kind == 'integer':
+            if series.dtype != narrowest_integer_dtype(series):
+                series = pd.to_numeric(series, downcast='integer')
+        elif kind == 'float' and series.dtype != float_dtype:
+            series = series.astype(float_dtype)
+        compact[column] = series
+    return pd.DataFrame(compact, index=df.index, copy=False)
+
+def memory_report(before, after):
+    """Compare per-column memory of a frame before and after compaction"""
+    report = pd.DataFrame({
+        'dtype_before': before.dtypes.astype(str),
+        'dtype_after': after.dtypes.reindex(before.columns).astype(str),
+        'mb_before': before.memory_usage(deep=True, index=False) / 1e6,
+        'mb_after': after.memory_usage(deep=True, index=False).reindex(before.columns) / 1e6,
+    })
+    report.loc['total'] = ['', '', report['mb_before'].sum(), report['mb_after'].sum()]
+    return report
+
+def column_store_version_path(path):
+    """Return a new version directory name for the column store at path"""
+    return f'{path}.v-{time.time_ns()}-{os.getpid()}'
+
+def write_column_store_manifest(version_dir, rows, columns):
+    """Write the manifest of a column store version from {column: (kind, dtype)}"""
+    manifest = {
+        'rows': rows,
+        'sorted_by': 'date' if 'date' in columns else None,
+        'columns': {column: {'kind': kind, 'dtype': np.dtype(dtype).str} for column, (kind, dtype) in columns.items()},
+    }
+    with open(os.path.join(version_dir, COLUMN_STORE_MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+def publish_column_store(version_dir, path):
+    """Point path at a complete store version with one atomic symlink swap
+
+    The previous version is kept for processes still reading it and older
+    versions are removed.
+    """
+    link = f'{path}.link-{os.getpid()}'
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(version_dir), link)
+
+    previous = os.path.realpath(path) if os.path.lexists(path) else None
+    if previous is not None and not os.path.islink(path):
+        # A store written before versioned directories; move it aside once
+        previous = column_store_version_path(path)
+        os.rename(path, previous)
+        previous = os.path.realpath(previous)
+    os.replace(link, path)
+
+    keep = {os.path.realpath(version_dir), previous}
+    directory = os.path.dirname(path) or '.'
+    prefix = f'{os.path.basename(path)}.v-'
+    for name in os.listdir(directory):
+        candidate = os.path.realpath(os.path.join(directory, name))
+        # Versions without a manifest are still being written by another process
+        if (name.startswith(prefix) and candidate not in keep
+                and os.path.exists(os.path.join(candidate, COLUMN_STORE_MANIFEST))):
+            shutil.rmtree(candidate, ignore_errors=True)
+
+@traced()
+def write_column_store(chunks, path, float_dtype=DEFAULT_FLOAT_DTYPE):
+    """Write DataFrame chunks as a column store of .npy files sorted by date
+
+    chunks may be a single DataFrame or any iterable of DataFrames. Columns
+    get the COMPACT_DTYPES; categoricals are stored as integer codes plus a
+    JSON dictionary. Each store is written to its own version directory and
+    published by atomically replacing the path symlink, so readers never
+    see a partial or missing store, and processes that still map the old
+    files keep reading them until they reopen.
+    """
+    path = str(path).rstrip('/')
+    version_dir = column_store_version_path(path)
+    os.makedirs(version_dir)
+    try:
+        if isinstance(chunks, pd.DataFrame):
+            rows = write_column_store_frame(chunks, version_dir, float_dtype)
+        else:
+            rows = write_column_store_chunks(chunks, version_dir, float_dtype)
+    except BaseException:
+        shutil.rmtree(version_dir, ignore_errors=True)
+        raise
+    publish_column_store(version_dir, path)
+    return rows
+
+def write_column_store_frame(df, version_dir, float_dtype):
+    """Write an in-memory frame into a store version directory"""
+    df = compact_frame(df, float_dtype)
+    if 'date' in df.columns:
+        df = df.sort_values('date', kind='stable')
+
+    columns = {}
+    for column in df.columns:
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            values = series.cat.codes.to_numpy()
+            with open(os.path.join(version_dir, f'{column}.dictionary.json'), 'w') as f:
+                json.dump(series.cat.categories.tolist(), f)
+            columns[column] = ('category', values.dtype)
+        else:
+            values = series.to_numpy()
+            columns[column] = ('array', values.dtype)
+        np.save(os.path.join(version_dir, f'{column}.npy'), np.ascontiguousarray(values))
+
+    write_column_store_manifest(version_dir, len(df), columns)
+    return len(df)
+
+def write_column_store_chunks(chunks, version_dir, float_dtype, block_rows=1_000_000):
+    """Stream chunks into a store version directory with bounded memory
+
+    Each chunk's columns are appended to raw spill files; categoricals are
+    re-coded against dictionaries grown across chunks and integers are kept
+    wide until their range is known. The columns are then gathered one at a
+    time, block_rows at a time, into date order, so memory holds one chunk
+    plus the sort order (8 bytes per row) rather than the data.
+    """
+    spills = {}
+    rows = 0
+    for chunk in chunks:
+        chunk = compact_frame(chunk, float_dtype)
+        for column in chunk.columns:
+            series = chunk[column]
+            spill = spills.get(column)
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                if spill is None:
+                    spill = spills[column] = {'kind': 'category', 'dtype': np.dtype(np.int32), 'codes': {}}
+                codes = spill['codes']
+                for category in series.cat.categories:
+                    codes.setdefault(category, len(codes))
+                # The extra -1 entry keeps missing values (code -1) missing
+                lookup = np.array([codes[c] for c in series.cat.categories] + [-1], dtype=np.int32)
+                values = lookup[series.cat.codes.to_numpy()]
+            elif pd.api.types.is_integer_dtype(series.dtype):
+                if spill is None:
+                    spill = spills[column] = {'kind': 'integer', 'dtype': np.dtype(np.int64), 'low': None, 'high': None}
+                values = series.to_numpy(np.int64)
+                if len(values):
+                    low, high = int(values.min()), int(values.max())
+                    spill['low'] = low if spill['low'] is None else min(spill['low'], low)
+                    spill['high'] = high if spill['high'] is None else max(spill['high'], high)
+            else:
+                if series.dtype == object:
+                    raise ValueError(f"Column store columns must be numeric, dates or categories: {column}")
+                if spill is None:
+                    spill = spills[column] = {'kind': 'array', 'dtype': series.to_numpy().dtype}
+                values = series.to_numpy().astype(spill['dtype'], copy=False)
+            with open(os.path.join(version_dir, f'{column}.spill'), 'ab') as f:
+                np.ascontiguousarray(values).tofile(f)
+        rows += len(chunk)
+
+    def read_spill(column):
+        spill_path = os.path.join(version_dir, f'{column}.spill')
+        if rows == 0:
+            return np.empty(0, dtype=spills[column]['dtype'])
+        return np.memmap(spill_path, dtype=spills[column]['dtype'], mode='r', shape=(rows,))
+
+    order = np.argsort(read_spill('date'), kind='stable') if 'date' in spills else None
+
+    columns = {}
+    for column, spill in spills.items():
+        transform = None
+        if spill['kind'] == 'category':
+            categories = sorted(spill['codes'])
+            # Codes follow the sorted dictionary, as in a frame's categoricals
+            rank = np.full(len(categories) + 1, -1, dtype=np.int32)
+            for position, category in enumerate(categories):
+                rank[spill['codes'][category]] = position
+            with open(os.path.join(version_dir, f'{column}.dictionary.json'), 'w') as f:
+                json.dump(categories, f)
+            dtype = integer_range_dtype(-1, len(categories))
+            transform = rank.__getitem__
+            columns[column] = ('category', dtype)
+        elif spill['kind'] == 'integer':
+            dtype = integer_range_dtype(spill['low'] or 0, spill['high'] or 0)
+            columns[column] = ('array', dtype)
+        else:
+            dtype = spill['dtype']
+            columns[column] = ('array', dtype)
+
+        values = read_spill(column)
+        output = np.lib.format.open_memmap(os.path.join(version_dir, f'{column}.npy'), mode='w+',
+                                           dtype=dtype, shape=(rows,))
+        for start in range(0, rows, block_rows):
+            block = values[order[start:start + block_rows]] if order is not None else values[start:start + block_rows]
+            output[start:start + block_rows] = transform(block) if transform is not None else block
+        output.flush()
+        del values, output
+        os.remove(os.path.join(version_dir, f'{column}.spill'))
+
+    write_column_store_manifest(version_dir, rows, columns)
+    return rows
+
+@traced()
+def open_column_store(path, columns=None, date_range=None):
+    """Open a column store as a read-only DataFrame over memory-mapped files
+
+    No column is parsed or copied: numeric and date columns are views of
+    np.load(mmap_mode='r') arrays and categoricals wrap their mapped codes,
+    so every process opening the store shares the OS page cache. A date
+    range is a binary-searched slice of the date-sorted rows.
+    """
+    # Resolve the store symlink once, so every column comes from one version
+    path = os.path.realpath(path)
+    with open(os.path.join(path, COLUMN_STORE_MANIFEST)) as f:
+        manifest = json.load(f)
+
+    data = {}
+    for column in columns or list(manifest['columns']):
+        values = np.load(os.path.join(path, f'{column}.npy'), mmap_mode='r')
+        if manifest['columns'][column]['kind'] == 'category':
+            with open(os.path.join(path, f'{column}.dictionary.json')) as f:
+                dtype = pd.CategoricalDtype(json.load(f))
+            values = pd.Categorical.from_codes(values, dtype=dtype, validate=False)
+        data[column] = values
+    df = pd.DataFrame(data, copy=False)
+
+    if date_range is not None:
+        dates = np.load(os.path.join(path, 'date.npy'), mmap_mode='r')
+        start, end = (np.datetime64(pd.Timestamp(b)).astype(dates.dtype) for b in date_range)
+        df = df.iloc[int(np.searchsorted(dates, start, 'left')):int(np.searchsorted(dates, end, 'right'))]
+    return df
+
+def sales_columns(path):
+    """Return the column names of a CSV file, Parquet dataset or column store"""
+    if is_column_store_path(path):
+        with open(os.path.join(path, COLUMN_STORE_MANIFEST)) as f:
+            return list(json.load(f)['columns'])
+    if is_parquet_path(path):
+        return open_dataset(path).schema.names
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+def iter_sales(path, columns=None, chunk_size=1_000_000, date_errors='raise'):
+    """Yield sales data in chunks of at most chunk_size rows
+
+    Reads a CSV file, Parquet dataset or column store with only the given
+    columns; CSV dates are parsed per chunk, with date_errors passed to
+    pd.to_datetime ('coerce' turns malformed dates into NaT).
+    """
+    if is_column_store_path(path):
+        df = open_column_store(path, columns)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+    elif is_parquet_path(path):
+        yield from iter_parquet(path, columns, chunk_size)
+    else:
+        for chunk in pd.read_csv(path, usecols=columns, chunksize=chunk_size):
+            if 'date' in chunk.columns:
+                chunk['date'] = pd.to_datetime(chunk['date'], errors=date_errors)
+            yield chunk
+
+@traced()
+def read_sales(path, columns=None, date_range=None, schema=None, compact=False, float_dtype=DEFAULT_FLOAT_DTYPE):
+    """Read sales data from a CSV file or Parquet dataset
+
+    Parquet reads push the projection and date range down to the scan; CSV
+    reads project with usecols and filter the date range after parsing.
+    Column stores are memory-mapped and already compact. With compact=True
+    the frame is converted to the COMPACT_DTYPES.
+    """
+    if is_column_store_path(path):
+        return open_column_store(path, columns, date_range)
+    if is_parquet_path(path):
+        df = read_parquet(path, columns, date_range, schema)
+    else:
+        df = pd.read_csv(path, usecols=columns)
+        if 'date' in df.columns:
+            df['date'] = pd.to_datetime(df['date'])
+            if date_range is not None:
+                df = df[(df['date'] >= pd.Timestamp(date_range[0])) & (df['date'] <= pd.Timestamp(date_range[1]))]
+    return compact_frame(df, float_dtype) if compact else df
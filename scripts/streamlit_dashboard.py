@@ -12,6 +12,18 @@ from plotly.subplots import make_subplots
 import numpy as np
 from datetime import datetime
 import os
+from concurrent.futures import ThreadPoolExecutor
+from storage import compact_frame, is_column_store_path, iter_sales, memory_report, read_sales
+from query_backend import DataFrameBackend, SQLiteBackend, date_bounds, filter_key
+from filter_index import FilterIndex
+from result_cache import ResultCache, data_version
+from instrumentation import collect, span, traced
+from analytics import compute_insights
+from approximate import ApproximateAggregates, ApproximateIndex
+from topk_index import TopKIndex
+from trends import GRANULARITIES, TrendRollups
+from downsampling import bin_budget, downsample_series, point_budget
+from data_export import DEFAULT_EXPORT_CHUNK_SIZE, EXPORT_FORMATS, export_bytes
 
 # Set page config
 st.set_page_config(
@@ -21,52 +33,289 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-@st.cache_data
-def load_data():
-    """Load and cache the cleaned sales data"""
-    df = pd.read_csv('data/clean_sales_data.csv')
-    df['date'] = pd.to_datetime(df['date'])
-    return df
+CLEAN_DATA_CSV = 'data/clean_sales_data.csv'
+CLEAN_DATA_PARQUET = 'data/clean_sales_data.parquet'
+CLEAN_DATA_COLUMNS = 'data/clean_sales_data.columns'
+DATABASE_PATH = 'data/sales.db'
 
-def create_kpi_metrics(df):
-    """Create KPI metrics display"""
+MEMORY_SOURCE = 'In-memory (CSV/Parquet)'
+SQLITE_SOURCE = 'SQLite (query pushdown)'
+
+# Columns needed to build the sidebar filters, and by the dashboard itself
+FILTER_COLUMNS = ['date', 'product', 'region', 'year']
+DASHBOARD_COLUMNS = ['date', 'product', 'region', 'salesperson', 'quantity',
+                     'unit_price', 'total_sales', 'month', 'year']
+
+# Dashboard views; only the selected one is computed on each rerun
+OVERVIEW_VIEW = "📊 Overview"
+CHARTS_VIEW = "📈 Individual Charts"
+INSIGHTS_VIEW = "🔍 Insights"
+RAW_DATA_VIEW = "📋 Raw Data"
+VIEWS = [OVERVIEW_VIEW, CHARTS_VIEW, INSIGHTS_VIEW, RAW_DATA_VIEW]
+
+PAGE_SIZES = [50, 100, 500, 1000]
+
+# Approximate pixel size of one overview subplot, for downsampling budgets
+OVERVIEW_CELL_PX = (400, 350)
+
+# Width of unit_price/total_sales in memory; 'float32' halves them at ~7 digits
+FLOAT_DTYPE = 'float64'
+
+# Rows per Parquet chunk while building the approximate-mode sample
+APPROXIMATE_CHUNK_ROWS = 250_000
+
+def clean_data_path():
+    """Return the cleaned data source, preferring the column store, then Parquet"""
+    for path in (CLEAN_DATA_COLUMNS, CLEAN_DATA_PARQUET):
+        if os.path.isdir(path):
+            return path
+    return CLEAN_DATA_CSV
+
+@st.cache_data(max_entries=2)
+def load_csv_data(path, version=None):
+    """Load and cache the full cleaned CSV file
+
+    version is the file's data version, so a rewritten file is re-read.
+    """
+    return read_sales(path)
+
+def read_clean_data(columns=None, date_range=None, version=None):
+    """Read the cleaned sales data with its stored dtypes
+
+    Column stores are memory-mapped; Parquet sources only scan the requested
+    columns and the year/month partitions overlapping date_range; CSV
+    sources are parsed once and sliced.
+    """
+    path = clean_data_path()
+    if path != CLEAN_DATA_CSV:
+        return read_sales(path, columns, date_range)
+
+    df = load_csv_data(path, version)
+    if date_range is not None:
+        df = df[(df['date'] >= pd.Timestamp(date_range[0])) & (df['date'] <= pd.Timestamp(date_range[1]))]
+    return df[columns] if columns is not None else df
+
+@st.cache_data(max_entries=4)
+def load_data(columns=None, date_range=None, version=None):
+    """Load and cache the cleaned sales data with compact dtypes"""
+    return compact_frame(read_clean_data(columns, date_range, version), FLOAT_DTYPE)
+
+@st.cache_data(max_entries=2)
+def load_filter_options(version=None):
+    """Load and cache the sidebar filter values and total row count
+
+    version is the data version, so the options and row count refresh when
+    the cleaned data is rewritten.
+    """
+    if is_column_store_path(clean_data_path()):
+        # Mapped columns are read in place instead of cached as a copy
+        options_df = read_clean_data(columns=FILTER_COLUMNS, version=version)
+    else:
+        options_df = load_data(columns=FILTER_COLUMNS, version=version)
+    return DataFrameBackend(options_df).filter_options(), len(options_df)
+
+@st.cache_resource(max_entries=8)
+def load_filter_index(date_range=None, version=None):
+    """Build and cache the filter index over the dashboard columns
+
+    The index is shared across reruns and sessions and never mutated, so
+    filter changes do not reload or copy the data. A column store is
+    indexed in place over its mapped files, so server processes share one
+    copy of the data through the page cache. version is the data version,
+    so a rewritten dataset is reopened. Returns the index and a memory
+    report of the frame before and after compaction.
+    """
+    raw = read_clean_data(DASHBOARD_COLUMNS, date_range, version)
+    df = compact_frame(raw, FLOAT_DTYPE)
+    return FilterIndex(df), memory_report(raw, df)
+
+@st.cache_resource(max_entries=8)
+def load_topk_index(date_range=None, version=None):
+    """Build and cache the per-month leaderboards of the indexed frame"""
+    index, _ = load_filter_index(date_range, version)
+    return TopKIndex(index.df)
+
+@st.cache_resource(max_entries=2)
+def load_approximate_index(version=None):
+    """Build and cache the stratified sample and order-value sketch
+
+    Built the first time approximate mode is used for a data version, over
+    the full data whatever the selected date range; the sample's own filter
+    index and the monthly sketch strata apply the date filter afterwards.
+    """
+    path = clean_data_path()
+    if path == CLEAN_DATA_PARQUET:
+        # Parquet dashboards load one date range at a time, so the full
+        # dataset is streamed in chunks rather than loaded
+        return ApproximateIndex(lambda columns: iter_sales(path, columns, APPROXIMATE_CHUNK_ROWS))
+    # CSV and column store dashboards already index the full data
+    index, _ = load_filter_index(None, version)
+    return ApproximateIndex(index.df)
+
+@st.cache_resource
+def get_background_executor():
+    """Return the shared pool that computes exact results behind approximate ones"""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix='exact')
+
+@st.cache_resource
+def get_result_cache():
+    """Return the filter-keyed result cache shared by every session"""
+    return ResultCache()
+
+@st.cache_resource(max_entries=2, on_release=SQLiteBackend.close)
+def get_sqlite_backend(database_path, version):
+    """Open a shared read-only SQLite query backend
+
+    version is the data version of the database and its WAL file, so a
+    reload opens a new backend that re-reads which summary tables exist.
+    """
+    if not os.path.exists(database_path):
+        raise FileNotFoundError(database_path)
+    return SQLiteBackend(database_path)
+
+@st.cache_data(max_entries=2)
+def load_sqlite_overview(database_path, version):
+    """Load and cache the filter values and row count from SQLite
+
+    version is the data version of the database and its WAL file, so a
+    reload invalidates the cache.
+    """
+    backend = get_sqlite_backend(database_path, version)
+    return backend.filter_options(), backend.total_rows()
+
+def display_memory_report(report):
+    """Show the in-memory footprint of the loaded data in the sidebar"""
+    before, after = report.loc['total', ['mb_before', 'mb_after']]
+    with st.sidebar.expander(f"💾 Memory: {after:,.1f} MB (was {before:,.1f} MB)"):
+        st.dataframe(report.round(2), use_container_width=True)
+
+def display_cache_stats(cache):
+    """Show the result cache counters in the sidebar"""
+    stats = cache.stats()
+    st.sidebar.caption(
+        f"⚡ Result cache: {stats['hits']:,} hits / {stats['misses']:,} misses "
+        f"({stats['hit_rate']:.0%}), {stats['entries']} entries"
+    )
+
+def display_performance_panel(spans, lookups):
+    """Show per-stage timings and result cache hits for the current rerun"""
+    total_ms = sum(s['duration_ms'] for s in spans if s['depth'] == 0)
+    
+    with st.sidebar.expander(f"⏱️ Performance: {total_ms:,.0f} ms traced", expanded=True):
+        st.caption(f"Result cache this rerun: {lookups['hits']} hits / {lookups['misses']} misses")
+        timings = pd.DataFrame({
+            'stage': ['\u2003' * s['depth'] + s['name'] for s in spans],
+            'ms': [round(s['duration_ms'], 1) for s in spans],
+        })
+        st.dataframe(timings, use_container_width=True, hide_index=True)
+
+def render_figure(cache, cache_key, name, build):
+    """Build a chart (or fetch it from the result cache) and draw it"""
+    with span(f'figure:{name}'):
+        fig = cache.figure(cache_key + (name,), build)
+    with span(f'plotly_chart:{name}'):
+        st.plotly_chart(fig, use_container_width=True)
+
+def select_data_source():
+    """Let the user choose between the in-memory and SQLite backends"""
+    if not os.path.exists(DATABASE_PATH):
+        return MEMORY_SOURCE
+    return st.sidebar.radio(
+        "🗄️ Data Source",
+        [MEMORY_SOURCE, SQLITE_SOURCE],
+        help="SQLite runs filters and aggregations in the database, for datasets larger than memory"
+    )
+
+@traced()
+def create_kpi_metrics(kpis, margins=None):
+    """Create KPI metrics display
+
+    With margins (approximate mode), values are marked as estimates and
+    their 95% error bounds are shown under each metric.
+    """
     col1, col2, col3, col4 = st.columns(4)
+    prefix = "≈" if margins else ""
+    
+    def bound(name, fmt):
+        return f"± {fmt.format(margins[name])}" if margins else None
     
     with col1:
-        total_revenue = df['total_sales'].sum()
         st.metric(
             label="💰 Total Revenue",
-            value=f"${total_revenue:,.0f}"
+            value=f"{prefix}${kpis.total_revenue:,.0f}",
+            delta=bound('total_revenue', "${:,.0f}"),
+            delta_color="off"
         )
     
     with col2:
-        total_transactions = len(df)
         st.metric(
             label="📋 Total Transactions",
-            value=f"{total_transactions:,}"
+            value=f"{prefix}{kpis.total_transactions:,}",
+            delta=bound('total_transactions', "{:,.0f}"),
+            delta_color="off"
         )
     
     with col3:
-        avg_order_value = df['total_sales'].mean()
         st.metric(
             label="📈 Avg Order Value",
-            value=f"${avg_order_value:,.0f}"
+            value=f"{prefix}${kpis.avg_order_value:,.0f}",
+            delta=bound('avg_order_value', "${:,.0f}"),
+            delta_color="off"
         )
     
     with col4:
-        total_quantity = df['quantity'].sum()
         st.metric(
             label="📦 Total Quantity",
-            value=f"{total_quantity:,}"
+            value=f"{prefix}{kpis.total_quantity:,}",
+            delta=bound('total_quantity', "{:,.0f}"),
+            delta_color="off"
         )
 
-def create_sidebar_filters(df):
+def display_approximation_note(approximate_index, aggs, filters):
+    """Describe the estimates and show the sketched order-value quantiles"""
+    quantiles = approximate_index.order_value_quantiles(filters)
+    st.caption(
+        f"⚡ Approximate: estimated from {aggs.sample_rows:,} sampled rows; ± values are "
+        f"95% confidence bounds. Order value p50 / p90 / p99 ≈ "
+        + " / ".join(f"${value:,.0f}" for value in quantiles.values())
+    )
+
+@st.fragment(run_every=1.0)
+def poll_exact_results(cache, key):
+    """Rerun the app once the background exact aggregation has finished"""
+    if cache.contains(key):
+        st.rerun()
+    error = cache.background_error(key)
+    if error is not None:
+        st.error(f"❌ Exact values could not be computed: {error!r}; showing the estimates")
+        return
+    st.caption("⏳ Computing exact values in the background; they replace the estimates when ready")
+
+def leaderboard(backend, aggs, dimension, filters, k):
+    """Return the top-k values of a dimension, from the top-K index when it covers the filters
+
+    Approximate aggregates are used as they are, so their error bounds stay
+    consistent with the other charts.
+    """
+    if not isinstance(aggs, ApproximateAggregates):
+        data = backend.top(dimension, filters, k)
+        if data is not None:
+            return data
+    return aggs.sales_by(dimension, order='desc', limit=k)
+
+def error_bars(data):
+    """Return Plotly error bars for an approximate breakdown, or None"""
+    if 'margin' not in data.columns:
+        return None
+    return dict(type='data', array=data['margin'])
+
+def create_sidebar_filters(options):
     """Create sidebar filters"""
     st.sidebar.header("🔧 Dashboard Filters")
     
     # Date range filter
-    min_date = df['date'].min().date()
-    max_date = df['date'].max().date()
+    min_date = options['min_date']
+    max_date = options['max_date']
     date_range = st.sidebar.date_input(
         "Select Date Range",
         value=(min_date, max_date),
@@ -75,7 +324,7 @@ def create_sidebar_filters(df):
     )
     
     # Product filter
-    products = ['All'] + sorted(df['product'].unique().tolist())
+    products = ['All'] + options['products']
     selected_products = st.sidebar.multiselect(
         "Select Products",
         products,
@@ -83,7 +332,7 @@ def create_sidebar_filters(df):
     )
     
     # Region filter
-    regions = ['All'] + sorted(df['region'].unique().tolist())
+    regions = ['All'] + options['regions']
     selected_regions = st.sidebar.multiselect(
         "Select Regions",
         regions,
@@ -91,7 +340,7 @@ def create_sidebar_filters(df):
     )
     
     # Year filter
-    years = ['All'] + sorted(df['year'].unique().tolist())
+    years = ['All'] + options['years']
     selected_years = st.sidebar.multiselect(
         "Select Years",
         years,
@@ -105,47 +354,21 @@ def create_sidebar_filters(df):
         'years': selected_years
     }
 
-def apply_filters(df, filters):
-    """Apply selected filters to dataframe"""
-    filtered_df = df.copy()
-    
-    # Apply date filter
-    if len(filters['date_range']) == 2:
-        start_date = pd.to_datetime(filters['date_range'][0])
-        end_date = pd.to_datetime(filters['date_range'][1])
-        filtered_df = filtered_df[
-            (filtered_df['date'] >= start_date) & 
-            (filtered_df['date'] <= end_date)
-        ]
-    
-    # Apply product filter
-    if 'All' not in filters['products'] and len(filters['products']) > 0:
-        filtered_df = filtered_df[filtered_df['product'].isin(filters['products'])]
-    
-    # Apply region filter
-    if 'All' not in filters['regions'] and len(filters['regions']) > 0:
-        filtered_df = filtered_df[filtered_df['region'].isin(filters['regions'])]
-    
-    # Apply year filter
-    if 'All' not in filters['years'] and len(filters['years']) > 0:
-        filtered_df = filtered_df[filtered_df['year'].isin(filters['years'])]
-    
-    return filtered_df
-
-def create_monthly_trends_chart(df):
-    """Create monthly trends chart"""
-    monthly_data = df.groupby('month')['total_sales'].sum().reset_index()
+@traced()
+def create_trends_chart(trend_data, granularity):
+    """Create revenue trends chart at the given granularity"""
+    trend_data = downsample_series(trend_data, 'date', 'total_sales', point_budget())
     
     fig = px.line(
-        monthly_data, 
-        x='month', 
+        trend_data, 
+        x='date', 
         y='total_sales',
-        title='📈 Monthly Revenue Trends',
-        labels={'total_sales': 'Revenue ($)', 'month': 'Month'}
+        title=f'📈 Revenue Trends by {granularity.title()}',
+        labels={'total_sales': 'Revenue ($)', 'date': granularity.title()}
     )
     
     fig.update_traces(
-        line=dict(color='#3498db', width=4),
+        line=dict(color='#3498db', width=2 if granularity in ('day', 'week') else 4),
         marker=dict(size=10)
     )
     
@@ -156,15 +379,17 @@ def create_monthly_trends_chart(df):
     
     return fig
 
-def create_product_analysis_chart(df):
+@traced()
+def create_product_analysis_chart(aggs):
     """Create product analysis chart"""
-    product_data = df.groupby('product')['total_sales'].sum().sort_values(ascending=False).reset_index()
+    product_data = aggs.sales_by('product', order='desc')
     
     fig = px.bar(
         product_data,
         x='product',
         y='total_sales',
         title='🏆 Revenue by Product',
+        error_y='margin' if 'margin' in product_data.columns else None,
         color='total_sales',
         color_continuous_scale='Blues'
     )
@@ -176,9 +401,10 @@ def create_product_analysis_chart(df):
     
     return fig
 
-def create_regional_distribution_chart(df):
+@traced()
+def create_regional_distribution_chart(aggs):
     """Create regional distribution pie chart"""
-    regional_data = df.groupby('region')['total_sales'].sum().reset_index()
+    regional_data = aggs.sales_by('region')
     
     fig = px.pie(
         regional_data,
@@ -195,9 +421,10 @@ def create_regional_distribution_chart(df):
     
     return fig
 
-def create_yearly_comparison_chart(df):
+@traced()
+def create_yearly_comparison_chart(aggs):
     """Create year-over-year comparison chart"""
-    yearly_data = df.groupby('year')['total_sales'].sum().reset_index()
+    yearly_data = aggs.sales_by('year')
     
     fig = px.bar(
         yearly_data,
@@ -205,6 +432,7 @@ def create_yearly_comparison_chart(df):
         y='total_sales',
         title='📅 Year-over-Year Revenue Comparison',
         text='total_sales',
+        error_y='margin' if 'margin' in yearly_data.columns else None,
         color='total_sales',
         color_continuous_scale='Greens'
     )
@@ -217,9 +445,9 @@ def create_yearly_comparison_chart(df):
     
     return fig
 
-def create_top_performers_chart(df):
-    """Create top sales performers chart"""
-    performer_data = df.groupby('salesperson')['total_sales'].sum().sort_values(ascending=False).head(10).reset_index()
+@traced()
+def create_top_performers_chart(performer_data):
+    """Create top sales performers chart from a [salesperson, total_sales] leaderboard"""
     
     fig = px.bar(
         performer_data,
@@ -227,6 +455,7 @@ def create_top_performers_chart(df):
         y='salesperson',
         orientation='h',
         title='👥 Top Sales Performers',
+        error_x='margin' if 'margin' in performer_data.columns else None,
         color='total_sales',
         color_continuous_scale='Oranges'
     )
@@ -238,20 +467,20 @@ def create_top_performers_chart(df):
     
     return fig
 
-def create_price_quantity_scatter(df):
-    """Create price vs quantity scatter plot"""
-    # Sample for better performance
-    sample_data = df.sample(n=min(1000, len(df)))
-    
+@traced()
+def create_price_quantity_scatter(scatter_bins):
+    """Create price vs quantity scatter plot from density bins"""
     fig = px.scatter(
-        sample_data,
+        scatter_bins,
         x='unit_price',
         y='quantity',
-        color='total_sales',
+        color='mean_total_sales',
         title='💲 Price vs Quantity Analysis',
         color_continuous_scale='Viridis',
-        hover_data=['product', 'region']
+        hover_data=['count'],
+        labels={'mean_total_sales': 'Avg Sale ($)', 'count': 'Transactions'}
     )
+    fig.update_traces(marker=dict(symbol='square'))
     
     fig.update_layout(
         height=400,
@@ -260,7 +489,8 @@ def create_price_quantity_scatter(df):
     
     return fig
 
-def create_comprehensive_dashboard(df):
+@traced()
+def create_comprehensive_dashboard(aggs, monthly_data, scatter_bins, performer_data):
     """Create comprehensive dashboard with subplots"""
     # Create subplots
     fig = make_subplots(
@@ -276,23 +506,23 @@ def create_comprehensive_dashboard(df):
     )
     
     # Monthly trends
-    monthly_data = df.groupby('month')['total_sales'].sum().reset_index()
+    monthly_data = downsample_series(monthly_data, 'date', 'total_sales', point_budget(OVERVIEW_CELL_PX[0]))
     fig.add_trace(
-        go.Scatter(x=monthly_data['month'], y=monthly_data['total_sales'],
+        go.Scatter(x=monthly_data['date'], y=monthly_data['total_sales'],
                   mode='lines+markers', name='Monthly Revenue'),
         row=1, col=1
     )
     
     # Product performance
-    product_data = df.groupby('product')['total_sales'].sum().sort_values(ascending=False).reset_index()
+    product_data = aggs.sales_by('product', order='desc')
     fig.add_trace(
         go.Bar(x=product_data['product'], y=product_data['total_sales'],
-               name='Product Revenue'),
+               error_y=error_bars(product_data), name='Product Revenue'),
         row=1, col=2
     )
     
     # Regional distribution
-    regional_data = df.groupby('region')['total_sales'].sum().reset_index()
+    regional_data = aggs.sales_by('region')
     fig.add_trace(
         go.Pie(labels=regional_data['region'], values=regional_data['total_sales'],
                name="Regional Sales"),
@@ -300,26 +530,25 @@ def create_comprehensive_dashboard(df):
     )
     
     # Yearly comparison
-    yearly_data = df.groupby('year')['total_sales'].sum().reset_index()
+    yearly_data = aggs.sales_by('year')
     fig.add_trace(
         go.Bar(x=yearly_data['year'], y=yearly_data['total_sales'],
-               name='Yearly Revenue'),
+               error_y=error_bars(yearly_data), name='Yearly Revenue'),
         row=2, col=1
     )
     
     # Top performers
-    performer_data = df.groupby('salesperson')['total_sales'].sum().sort_values(ascending=False).head(5).reset_index()
     fig.add_trace(
         go.Bar(x=performer_data['total_sales'], y=performer_data['salesperson'],
-               orientation='h', name='Top Performers'),
+               orientation='h', error_x=error_bars(performer_data), name='Top Performers'),
         row=2, col=2
     )
     
     # Price vs quantity
-    sample_data = df.sample(n=min(500, len(df)))
     fig.add_trace(
-        go.Scatter(x=sample_data['unit_price'], y=sample_data['quantity'],
-                  mode='markers', name='Price vs Quantity'),
+        go.Scatter(x=scatter_bins['unit_price'], y=scatter_bins['quantity'],
+                  mode='markers', name='Price vs Quantity',
+                  marker=dict(color=scatter_bins['count'], colorscale='Viridis', symbol='square')),
         row=2, col=3
     )
     
@@ -331,7 +560,8 @@ def create_comprehensive_dashboard(df):
     
     return fig
 
-def display_data_insights(df):
+@traced()
+def display_data_insights(insights):
     """Display key data insights"""
     st.subheader("🔍 Key Insights")
     
@@ -339,137 +569,218 @@ def display_data_insights(df):
     
     with col1:
         st.write("**📊 Revenue Analysis:**")
-        total_revenue = df['total_sales'].sum()
-        st.write(f"• Total Revenue: ${total_revenue:,.0f}")
+        st.write(f"• Total Revenue: ${insights.kpis.total_revenue:,.0f}")
         
         # Top product
-        top_product = df.groupby('product')['total_sales'].sum().sort_values(ascending=False)
-        st.write(f"• Top Product: {top_product.index[0]} (${top_product.iloc[0]:,.0f})")
+        top_product = insights.top_product
+        st.write(f"• Top Product: {top_product.name} (${top_product.total_sales:,.0f})")
         
         # Top region
-        top_region = df.groupby('region')['total_sales'].sum().sort_values(ascending=False)
-        st.write(f"• Top Region: {top_region.index[0]} (${top_region.iloc[0]:,.0f})")
+        top_region = insights.top_region
+        st.write(f"• Top Region: {top_region.name} (${top_region.total_sales:,.0f})")
     
     with col2:
         st.write("**📈 Growth Analysis:**")
         
         # YoY Growth
-        yearly_revenue = df.groupby('year')['total_sales'].sum()
-        if len(yearly_revenue) > 1:
-            years = sorted(yearly_revenue.index)
-            growth = ((yearly_revenue[years[1]] - yearly_revenue[years[0]]) / yearly_revenue[years[0]]) * 100
-            st.write(f"• YoY Growth: {growth:.1f}%")
+        if insights.yoy_growth is not None:
+            st.write(f"• YoY Growth: {insights.yoy_growth.growth_pct:.1f}%")
         
         # Peak month
-        monthly_revenue = df.groupby('month')['total_sales'].sum()
-        peak_month = monthly_revenue.idxmax()
-        st.write(f"• Peak Month: Month {peak_month} (${monthly_revenue[peak_month]:,.0f})")
+        peak_month = insights.peak_month
+        st.write(f"• Peak Month: Month {peak_month.name} (${peak_month.total_sales:,.0f})")
         
         # Average order value
-        avg_order = df['total_sales'].mean()
-        st.write(f"• Avg Order Value: ${avg_order:,.0f}")
+        st.write(f"• Avg Order Value: ${insights.kpis.avg_order_value:,.0f}")
+
+@traced()
+def display_raw_data(backend, filters, n_rows):
+    """Display raw data table with filters
 
-def display_raw_data(df):
-    """Display raw data table with filters"""
+    The table is paginated by the backend, so only the visible page is
+    pulled into the page. Exports are built only when the download button
+    is clicked, streamed in chunks to a compressed temporary file that is
+    removed once served, so reruns never read or keep export files.
+    """
     st.subheader("📋 Raw Data View")
     
     # Data summary
-    st.write(f"**Dataset Overview:** {len(df):,} transactions")
+    st.write(f"**Dataset Overview:** {n_rows:,} transactions")
     
-    # Display data
+    # Display one page of data
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1)
+    n_pages = max(1, -(-n_rows // page_size))
+    with col2:
+        page_number = st.number_input(f"Page (of {n_pages:,})", min_value=1, max_value=n_pages, value=1)
+    page = backend.page(filters, (page_number - 1) * page_size, page_size)
     st.dataframe(
-        df.round(2),
+        page.round(2),
         use_container_width=True,
         height=400
     )
     
-    # Download button
-    csv = df.to_csv(index=False)
-    st.download_button(
-        label="📥 Download Filtered Data as CSV",
-        data=csv,
-        file_name=f"sales_data_filtered_{datetime.now().strftime('%Y%m%d')}.csv",
-        mime="text/csv"
-    )
+    # The export is written only when the button is clicked, on Streamlit's
+    # download thread, and clicking it does not rerun the app
+    col3, col4 = st.columns([1, 3])
+    with col3:
+        fmt = st.selectbox("Export format", list(EXPORT_FORMATS))
+    with col4:
+        st.download_button(
+            label=f"📥 Download Filtered Data ({fmt})",
+            data=lambda: export_bytes(backend.iter_rows(filters, DEFAULT_EXPORT_CHUNK_SIZE), fmt),
+            file_name=f"sales_data_filtered_{datetime.now().strftime('%Y%m%d')}.{fmt}",
+            mime=EXPORT_FORMATS[fmt],
+            on_click='ignore'
+        )
 
-def main():
-    """Main Streamlit application"""
+def render_dashboard(cache):
+    """Render the dashboard for the current source and filter state"""
     # Header
     st.title("🚀 Sales Analytics Dashboard")
     st.markdown("**Interactive Sales Data Analysis and Visualization Platform**")
     
-    # Load data
+    # Choose the backend; every cached load below is keyed by the data
+    # version, so rewriting the data refreshes them all
+    source = select_data_source()
+    data_path = DATABASE_PATH if source == SQLITE_SOURCE else clean_data_path()
+    version = data_version(data_path)
     try:
-        df = load_data()
+        with span('load_filter_options', source=source):
+            if source == SQLITE_SOURCE:
+                options, total_rows = load_sqlite_overview(DATABASE_PATH, version)
+            else:
+                options, total_rows = load_filter_options(version)
     except FileNotFoundError:
         st.error("❌ Sales data not found. Please ensure 'data/clean_sales_data.csv' exists.")
         st.info("💡 Run the data generation and cleaning scripts first.")
         return
     
     # Sidebar filters
-    filters = create_sidebar_filters(df)
-    
-    # Apply filters
-    filtered_df = apply_filters(df, filters)
+    filters = create_sidebar_filters(options)
     
-    if len(filtered_df) == 0:
+    # Results are cached across sessions by source, data version and filters
+    cache.sync_version(source, version)
+    cache_key = (source, version, filter_key(filters))
+
+    date_range = None
+    if source == SQLITE_SOURCE:
+        backend = get_sqlite_backend(DATABASE_PATH, version)
+    else:
+        # Parquet scans only the selected date range; CSV is indexed once and
+        # the index resolves the date range along with the other filters
+        if clean_data_path() == CLEAN_DATA_PARQUET and len(filters['date_range']) == 2:
+            date_range = tuple(filters['date_range'])
+        with span('load_filter_index'):
+            index, memory = load_filter_index(date_range, version)
+        with span('load_topk_index'):
+            topk = load_topk_index(date_range, version)
+        backend = DataFrameBackend(index.df, index, topk)
+        display_memory_report(memory)
+    
+    # Approximate mode answers from a stratified sample while the exact
+    # aggregates compute in the background, until they are cached
+    aggregates_key = cache_key + ('aggregates',)
+    approximate_index = None
+    if source == MEMORY_SOURCE and st.sidebar.toggle(
+        "⚡ Approximate mode",
+        help="Estimate KPIs and breakdowns from a stratified sample; exact values replace them when ready"
+    ) and not cache.contains(aggregates_key):
+        exact_backend = DataFrameBackend(index.df, index)
+        cache.compute_in_background(aggregates_key, lambda: exact_backend.aggregates(filters),
+                                    get_background_executor())
+        with span('load_approximate_index'):
+            approximate_index = load_approximate_index(version)
+        cache_key = cache_key + ('approximate',)
+    
+    # Aggregate once per filter state; every chart and insight reads from this
+    with span('aggregates'):
+        if approximate_index is not None:
+            aggs = cache.get(cache_key + ('aggregates',), lambda: approximate_index.aggregates(filters))
+        else:
+            aggs = cache.get(aggregates_key, lambda: backend.aggregates(filters))
+    insights = cache.get(cache_key + ('insights',), lambda: compute_insights(
+        aggs, top=lambda dimension, k: leaderboard(backend, aggs, dimension, filters, k)
+    ))
+    filtered_count = insights.kpis.total_transactions
+    if filtered_count == 0:
         st.warning("⚠️ No data matches the selected filters. Please adjust your selection.")
         return
     
+    # Trends roll up daily totals for the non-date filters, so changing the
+    # date range or granularity only re-buckets days, never the raw rows
+    trend_filters = dict(filters, date_range=())
+    with span('trends'):
+        trends = cache.get(
+            (source, version, filter_key(trend_filters), date_range, 'trends'),
+            lambda: TrendRollups(backend.daily_totals(trend_filters))
+        )
+    bounds = date_bounds(filters) or (None, None)
+    
     # Show filter summary
-    st.info(f"📊 Showing {len(filtered_df):,} transactions out of {len(df):,} total")
+    approximately = "about " if approximate_index is not None else ""
+    st.info(f"📊 Showing {approximately}{filtered_count:,} transactions out of {total_rows:,} total")
     
     # KPI Metrics
-    create_kpi_metrics(filtered_df)
+    if approximate_index is not None:
+        create_kpi_metrics(insights.kpis, aggs.kpi_margins)
+        display_approximation_note(approximate_index, aggs, filters)
+        poll_exact_results(cache, aggregates_key)
+    else:
+        create_kpi_metrics(insights.kpis)
     
     st.markdown("---")
     
-    # Main dashboard tabs
-    tab1, tab2, tab3, tab4 = st.tabs(["📊 Overview", "📈 Individual Charts", "🔍 Insights", "📋 Raw Data"])
+    # Main dashboard views; unlike st.tabs, only the selected view is built
+    view_name = st.radio("View", VIEWS, horizontal=True, label_visibility="collapsed", key="dashboard_view")
     
-    with tab1:
+    if view_name == OVERVIEW_VIEW:
         st.subheader("📊 Dashboard Overview")
-        comprehensive_fig = create_comprehensive_dashboard(filtered_df)
-        st.plotly_chart(comprehensive_fig, use_container_width=True)
+        render_figure(cache, cache_key, 'overview', lambda: create_comprehensive_dashboard(
+            aggs, trends.series('month', *bounds),
+            backend.scatter_bins(filters, 'unit_price', 'quantity', 'total_sales', bin_budget(*OVERVIEW_CELL_PX)),
+            leaderboard(backend, aggs, 'salesperson', filters, 5)
+        ))
     
-    with tab2:
+    elif view_name == CHARTS_VIEW:
         st.subheader("📈 Detailed Analysis")
         
-        # Row 1: Monthly trends and Product analysis
+        # Row 1: Revenue trends and Product analysis
         col1, col2 = st.columns(2)
         with col1:
-            monthly_fig = create_monthly_trends_chart(filtered_df)
-            st.plotly_chart(monthly_fig, use_container_width=True)
+            granularity = st.selectbox("Trend granularity", list(GRANULARITIES), index=2)
+            render_figure(cache, cache_key, f'trends_{granularity}',
+                          lambda: create_trends_chart(trends.series(granularity, *bounds), granularity))
         
         with col2:
-            product_fig = create_product_analysis_chart(filtered_df)
-            st.plotly_chart(product_fig, use_container_width=True)
+            render_figure(cache, cache_key, 'product', lambda: create_product_analysis_chart(aggs))
         
         # Row 2: Regional distribution and Yearly comparison
         col3, col4 = st.columns(2)
         with col3:
-            regional_fig = create_regional_distribution_chart(filtered_df)
-            st.plotly_chart(regional_fig, use_container_width=True)
+            render_figure(cache, cache_key, 'regional', lambda: create_regional_distribution_chart(aggs))
         
         with col4:
-            yearly_fig = create_yearly_comparison_chart(filtered_df)
-            st.plotly_chart(yearly_fig, use_container_width=True)
+            render_figure(cache, cache_key, 'yearly', lambda: create_yearly_comparison_chart(aggs))
         
         # Row 3: Top performers and Price vs Quantity
         col5, col6 = st.columns(2)
         with col5:
-            performers_fig = create_top_performers_chart(filtered_df)
-            st.plotly_chart(performers_fig, use_container_width=True)
+            render_figure(cache, cache_key, 'performers', lambda: create_top_performers_chart(
+                leaderboard(backend, aggs, 'salesperson', filters, 10)
+            ))
         
         with col6:
-            scatter_fig = create_price_quantity_scatter(filtered_df)
-            st.plotly_chart(scatter_fig, use_container_width=True)
+            render_figure(cache, cache_key, 'scatter', lambda: create_price_quantity_scatter(
+                backend.scatter_bins(filters, 'unit_price', 'quantity', 'total_sales', bin_budget())
+            ))
     
-    with tab3:
-        display_data_insights(filtered_df)
+    elif view_name == INSIGHTS_VIEW:
+        display_data_insights(insights)
     
-    with tab4:
-        display_raw_data(filtered_df)
+    else:
+        display_raw_data(backend, filters, filtered_count)
     
     # Footer
     st.markdown("---")
@@ -480,10 +791,24 @@ def main():
     st.sidebar.info(
         "💡 **How to use:**\n\n"
         "1. Adjust filters to explore data\n"
-        "2. Switch between tabs for different views\n"
+        "2. Switch between views above the charts\n"
         "3. Hover over charts for details\n"
         "4. Download filtered data as CSV"
     )
 
+def main():
+    """Main Streamlit application"""
+    show_performance = st.sidebar.checkbox("⏱️ Performance panel", help="Time each stage of this rerun")
+    cache = get_result_cache()
+    
+    # Lookups are counted on this session's thread, so concurrent sessions
+    # do not inflate this rerun's numbers
+    with collect(show_performance) as spans, cache.count_lookups() as lookups:
+        render_dashboard(cache)
+    
+    display_cache_stats(cache)
+    if show_performance:
+        display_performance_panel(spans, lookups)
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,98 @@
+"""
+Top-K Index
+Per-month totals for each leaderboard dimension, summed over the selected months
+"""
+
+import numpy as np
+import pandas as pd
+from instrumentation import traced
+from parallel_aggregation import dimension_codes
+
+# Dimensions with leaderboards; each keeps a month x value matrix of totals
+TOPK_DIMENSIONS = ['salesperson', 'product', 'region']
+
+# SQLite table holding the per-month totals; see load_to_sql.build_topk
+TOPK_TABLE = 'sales_topk'
+
+def month_bucket(year, month):
+    """Return the bucket number of a calendar month"""
+    return year * 12 + month - 1
+
+def bucket_selection(bounds, years, buckets, first_date, last_date):
+    """Return the buckets selected by a date range and years, or None if a bucket is cut
+
+    The (start, end) bounds must start on a month's first day (or before
+    the data) and end on a month's last day (or after the data).
+    """
+    buckets = np.asarray(buckets)
+    if bounds is not None:
+        start, end = bounds
+        if start > pd.Timestamp(first_date) and start.day != 1:
+            return None
+        if end < pd.Timestamp(last_date) and not end.is_month_end:
+            return None
+        buckets = buckets[(buckets >= month_bucket(start.year, start.month)) &
+                          (buckets <= month_bucket(end.year, end.month))]
+
+    if years is not None:
+        buckets = buckets[np.isin(buckets // 12, [int(y) for y in years])]
+    return buckets.tolist()
+
+def top_k_codes(totals, present, k):
+    """Return the codes of the k largest totals among the present ones, largest first"""
+    candidates = np.flatnonzero(present)
+    if k <= 0 or len(candidates) == 0:
+        return candidates[:0]
+    if k < len(candidates):
+        candidates = candidates[np.argpartition(-totals[candidates], k - 1)[:k]]
+    return candidates[np.argsort(-totals[candidates], kind='stable')]
+
+def leaderboard_frame(dimension, pairs):
+    """Return top-k pairs as a [dimension, total_sales] frame"""
+    return pd.DataFrame({
+        dimension: [key for key, _ in pairs],
+        'total_sales': np.array([total for _, total in pairs], dtype=np.float64),
+    })
+
+class TopKIndex:
+    """In-memory per-month leaderboard totals for a frame
+
+    For each dimension, keeps a dense month x value matrix of total_sales
+    and of row counts. A leaderboard over the selected months sums their
+    rows of the matrix and partitions out the k largest, so its cost
+    depends on months x values rather than on the number of sales rows.
+    """
+
+    def __init__(self, df, dimensions=TOPK_DIMENSIONS):
+        self.first_date = df['date'].min() if len(df) else None
+        self.last_date = df['date'].max() if len(df) else None
+        bucket = month_bucket(df['year'].to_numpy(dtype=np.int64), df['month'].to_numpy(dtype=np.int64))
+        self.buckets, bucket_codes = np.unique(bucket, return_inverse=True)
+        sales = df['total_sales'].to_numpy(dtype=np.float64)
+
+        self.values = {}
+        self.totals = {}
+        self.counts = {}
+        for dimension in dimensions:
+            codes, uniques = dimension_codes(df[dimension])
+            n_keys = max(len(uniques), 1)
+            cells = bucket_codes * n_keys + codes
+            shape = (len(self.buckets), n_keys)
+            self.values[dimension] = np.asarray(uniques)
+            self.totals[dimension] = np.bincount(cells, weights=sales, minlength=shape[0] * n_keys).reshape(shape)
+            self.counts[dimension] = np.bincount(cells, minlength=shape[0] * n_keys).reshape(shape)
+
+    @traced()
+    def top(self, dimension, k, bounds=None, years=None):
+        """Return the top-k [dimension, total_sales] frame, or None if the range cuts a month"""
+        if dimension not in self.totals or self.first_date is None:
+            return None
+        selected = bucket_selection(bounds, years, self.buckets, self.first_date, self.last_date)
+        if selected is None:
+            return None
+        rows = np.searchsorted(self.buckets, selected)
+        totals = self.totals[dimension][rows].sum(axis=0)
+        # Values with rows in the selection, including those whose sales net to zero
+        present = self.counts[dimension][rows].any(axis=0)
+        codes = top_k_codes(totals, present, k)
+        return leaderboard_frame(dimension, list(zip(self.values[dimension][codes], totals[codes].tolist())))
@@ -1,18 +1,19 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
+from trends import TrendRollups, daily_totals
 
 def basic_statistics(df):
     """Generate basic statistics for the dataset"""
     return df.describe()
 
-def plot_monthly_sales(df):
-    """Plot monthly sales trends"""
-    monthly_sales = df.groupby(['year', 'month'])['total_sales'].sum()
+def plot_monthly_sales(df, granularity='month'):
+    """Plot sales trends as a year-month (or other granularity) time series"""
+    trend = TrendRollups(daily_totals(df)).series(granularity)
     plt.figure(figsize=(12, 6))
-    monthly_sales.plot(kind='line')
-    plt.title('Monthly Sales Trends')
-    plt.xlabel('Month')
+    plt.plot(trend['date'], trend['total_sales'])
+    plt.title(f'Sales Trends by {granularity.title()}')
+    plt.xlabel(granularity.title())
     plt.ylabel('Total Sales')
     plt.show()
 
@@ -0,0 +1,419 @@
+"""
+Data Validation
+Declarative checks over the sales data, evaluated in one streaming pass
+
+A check declares the columns it reads, updates its counters from each
+chunk with vectorized operations, and reports a CheckResult at the end.
+validate() runs a list of checks over a CSV file, Parquet dataset or
+column store; a Validator can also be fed the chunks another stage is
+already streaming, so bulk_load gates a load without a second read.
+"""
+
+import abc
+import argparse
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List
+import numpy as np
+import pandas as pd
+from instrumentation import traced
+from storage import COMPACT_DTYPES, iter_sales, sales_columns
+
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+# total_sales may differ from quantity * unit_price by at most one cent
+TOTAL_TOLERANCE = 0.01
+
+# Value ranges of the cleaned columns; None leaves a side open
+VALUE_RANGES = {
+    'quantity': (1, None),
+    'unit_price': (0, None),
+    'total_sales': (0, None),
+    'month': (1, 12),
+    'quarter': (1, 4),
+}
+
+# Failing rows listed per check, as positions in the streamed data
+MAX_EXAMPLES = 5
+
+@dataclass(frozen=True)
+class CheckResult:
+    """Outcome of one check: rows that failed it, a summary and observed statistics"""
+    name: str
+    passed: bool
+    failures: int
+    detail: str
+    examples: List[int] = field(default_factory=list)
+    stats: Dict[str, object] = field(default_factory=dict)
+    seconds: float = 0.0
+
+@dataclass(frozen=True)
+class ValidationReport:
+    """Results of a validation pass with its row count and timing"""
+    source: str
+    rows: int
+    seconds: float
+    results: List[CheckResult]
+
+    @property
+    def passed(self):
+        """Return True if every check passed"""
+        return all(result.passed for result in self.results)
+
+    @property
+    def failed(self):
+        """Return the results of the checks that failed"""
+        return [result for result in self.results if not result.passed]
+
+    @property
+    def rows_per_sec(self):
+        """Return the validation throughput"""
+        return self.rows / max(self.seconds, 1e-9)
+
+    def result(self, name):
+        """Return the result of a check by name, or None"""
+        return next((result for result in self.results if result.name == name), None)
+
+    def raise_for_failures(self):
+        """Raise ValidationError if any check failed"""
+        if not self.passed:
+            raise ValidationError(self)
+
+class ValidationError(ValueError):
+    """Raised when data fails a validation gate"""
+
+    def __init__(self, report):
+        self.report = report
+        super().__init__(f"{report.source}: " + '; '.join(
+            f"{result.name}: {result.detail}" for result in report.failed
+        ))
+
+class Check(abc.ABC):
+    """Base class: reads columns from each chunk and counts failing rows"""
+
+    columns = ()
+
+    def __init__(self):
+        self.failures = 0
+        self.examples = []
+
+    def record(self, failing, offset):
+        """Count a chunk's boolean failure mask and keep the first failing positions"""
+        count = int(np.count_nonzero(failing))
+        if count:
+            self.failures += count
+            if len(self.examples) < MAX_EXAMPLES:
+                positions = np.flatnonzero(failing)[:MAX_EXAMPLES - len(self.examples)]
+                self.examples.extend((positions + offset).tolist())
+
+    @abc.abstractmethod
+    def update(self, chunk, offset):
+        """Update the check from a chunk whose first row is at position offset"""
+
+    def finish(self, rows):
+        """Return (detail, stats) once every chunk has been seen"""
+        return f"{self.failures:,} failing rows", {}
+
+def dtype_matches(dtype, kind):
+    """Return True if a dtype holds values of a COMPACT_DTYPES kind"""
+    if kind == 'datetime':
+        return pd.api.types.is_datetime64_any_dtype(dtype)
+    if kind == 'category':
+        return isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(dtype)
+    if kind == 'integer':
+        return pd.api.types.is_integer_dtype(dtype)
+    if kind == 'float':
+        return pd.api.types.is_float_dtype(dtype) or pd.api.types.is_integer_dtype(dtype)
+    return True
+
+class Schema(Check):
+    """Every column is present with a dtype of its expected kind; failures count columns"""
+
+    name = 'schema'
+
+    def __init__(self, kinds):
+        super().__init__()
+        self.kinds = dict(kinds)
+        self.columns = tuple(self.kinds)
+        self.problems = {}
+
+    def update(self, chunk, offset):
+        for column, kind in self.kinds.items():
+            if column not in chunk.columns:
+                self.problems[column] = 'missing'
+            elif not dtype_matches(chunk[column].dtype, kind) and column not in self.problems:
+                self.problems[column] = f"{chunk[column].dtype} is not {kind}"
+        self.failures = len(self.problems)
+
+    def finish(self, rows):
+        if not self.problems:
+            return f"{len(self.kinds)} columns", {}
+        return ', '.join(f"{column} {problem}" for column, problem in self.problems.items()), {}
+
+class NotNull(Check):
+    """No null values (or unparseable dates) in the given columns"""
+
+    name = 'not_null'
+
+    def __init__(self, columns):
+        super().__init__()
+        self.columns = tuple(columns)
+        self.counts = dict.fromkeys(self.columns, 0)
+
+    def update(self, chunk, offset):
+        present = [column for column in self.columns if column in chunk.columns]
+        nulls = chunk[present].isna().to_numpy()
+        for column, count in zip(present, nulls.sum(axis=0).tolist()):
+            self.counts[column] += count
+        self.record(nulls.any(axis=1), offset)
+
+    def finish(self, rows):
+        nulls = {column: count for column, count in self.counts.items() if count}
+        if not nulls:
+            return f"no nulls in {len(self.columns)} columns", {}
+        return ', '.join(f"{column}: {count:,}" for column, count in nulls.items()), nulls
+
+class InRange(Check):
+    """Values of a column lie within [low, high]; also tracks min, max and sum"""
+
+    def __init__(self, column, low=None, high=None):
+        super().__init__()
+        self.column = column
+        self.columns = (column,)
+        self.name = f'range({column})'
+        self.low, self.high = low, high
+        self.minimum, self.maximum, self.total = np.inf, -np.inf, 0.0
+
+    def update(self, chunk, offset):
+        if self.column not in chunk.columns:
+            return
+        values = chunk[self.column].to_numpy(dtype=np.float64, na_value=np.nan)
+        failing = np.zeros(len(values), dtype=bool)
+        if self.low is not None:
+            failing |= values < self.low
+        if self.high is not None:
+            failing |= values > self.high
+        self.record(failing, offset)
+        if len(values):
+            self.minimum = min(self.minimum, np.nanmin(values, initial=np.inf))
+            self.maximum = max(self.maximum, np.nanmax(values, initial=-np.inf))
+            self.total += float(np.nansum(values))
+
+    def finish(self, rows):
+        bounds = f"[{'-inf' if self.low is None else self.low}, {'inf' if self.high is None else self.high}]"
+        if self.minimum > self.maximum:
+            return f"no values within {bounds}", {}
+        stats = {'min': float(self.minimum), 'max': float(self.maximum), 'sum': self.total}
+        if self.failures:
+            return f"{self.failures:,} rows outside {bounds}", stats
+        return f"{self.minimum:,.2f} to {self.maximum:,.2f} within {bounds}", stats
+
+class TotalMatchesProduct(Check):
+    """total_sales equals quantity * unit_price within a tolerance"""
+
+    name = 'total_sales == quantity * unit_price'
+    columns = ('total_sales', 'quantity', 'unit_price')
+
+    def __init__(self, tolerance=TOTAL_TOLERANCE):
+        super().__init__()
+        self.tolerance = tolerance
+        self.max_error = 0.0
+
+    def update(self, chunk, offset):
+        if not set(self.columns) <= set(chunk.columns):
+            return
+        total, quantity, price = (chunk[column].to_numpy(dtype=np.float64, na_value=np.nan) for column in self.columns)
+        error = np.abs(total - quantity * price)
+        self.record(error > self.tolerance, offset)
+        if len(error):
+            self.max_error = max(self.max_error, float(np.nanmax(error, initial=0.0)))
+
+    def finish(self, rows):
+        return (f"{self.failures:,} mismatched rows, max error {self.max_error:,.4f}",
+                {'max_error': self.max_error})
+
+class DateBounds(Check):
+    """Dates lie within [start, end] and year/month/quarter agree with them"""
+
+    name = 'date_bounds'
+    columns = ('date', 'year', 'month', 'quarter')
+
+    def __init__(self, start=None, end=None):
+        super().__init__()
+        self.start = pd.Timestamp(start) if start is not None else None
+        self.end = pd.Timestamp(end) if end is not None else None
+        self.first = self.last = None
+        self.mismatched = 0
+
+    def update(self, chunk, offset):
+        if 'date' not in chunk.columns:
+            return
+        dates = chunk['date']
+        failing = np.zeros(len(chunk), dtype=bool)
+        if self.start is not None:
+            failing |= (dates < self.start).to_numpy()
+        if self.end is not None:
+            failing |= (dates > self.end).to_numpy()
+
+        # Derived date features must match the date they came from
+        derived = np.zeros(len(chunk), dtype=bool)
+        for column, part in (('year', dates.dt.year), ('month', dates.dt.month), ('quarter', dates.dt.quarter)):
+            if column in chunk.columns:
+                derived |= (chunk[column].to_numpy() != part.to_numpy()) & dates.notna().to_numpy()
+        self.mismatched += int(np.count_nonzero(derived))
+        self.record(failing | derived, offset)
+
+        if dates.notna().any():
+            first, last = dates.min(), dates.max()
+            self.first = first if self.first is None else min(self.first, first)
+            self.last = last if self.last is None else max(self.last, last)
+
+    def finish(self, rows):
+        span = f"{self.first:%Y-%m-%d} to {self.last:%Y-%m-%d}" if self.first is not None else 'no dates'
+        stats = {'first': self.first, 'last': self.last}
+        if self.failures:
+            return f"{self.failures:,} rows out of bounds or with mismatched date parts ({span})", stats
+        return span, stats
+
+class Cardinality(Check):
+    """A column has at least a minimum number of distinct values"""
+
+    def __init__(self, column, minimum=1):
+        super().__init__()
+        self.column = column
+        self.columns = (column,)
+        self.name = f'distinct({column})'
+        self.minimum = minimum
+        self.values = set()
+
+    def update(self, chunk, offset):
+        if self.column in chunk.columns:
+            self.values.update(chunk[self.column].dropna().unique().tolist())
+
+    def finish(self, rows):
+        count = len(self.values)
+        self.failures = int(count < self.minimum)
+        return f"{count:,} distinct (minimum {self.minimum:,})", {'distinct': count}
+
+class RowCountParity(Check):
+    """The streamed row count equals the row count of a SQLite table"""
+
+    name = 'row_count_parity'
+
+    def __init__(self, database, table='sales'):
+        super().__init__()
+        self.database = database
+        self.table = table
+
+    def update(self, chunk, offset):
+        pass
+
+    def finish(self, rows):
+        conn = sqlite3.connect(f'file:{self.database}?mode=ro', uri=True)
+        try:
+            db_rows = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        finally:
+            conn.close()
+        self.failures = abs(rows - db_rows)
+        return f"{rows:,} rows in source, {db_rows:,} in {self.table}", {'database_rows': db_rows}
+
+def default_checks(database=None, start=None, end=None):
+    """Return the checks for cleaned sales data, with DB parity when a database is given"""
+    checks = [
+        Schema(COMPACT_DTYPES),
+        NotNull(list(COMPACT_DTYPES)),
+        *(InRange(column, low, high) for column, (low, high) in VALUE_RANGES.items()),
+        TotalMatchesProduct(),
+        DateBounds(start, end),
+        Cardinality('product'),
+        Cardinality('region'),
+    ]
+    if database is not None:
+        checks.append(RowCountParity(database))
+    return checks
+
+class Validator:
+    """Runs checks over chunks as they stream past"""
+
+    def __init__(self, checks, source=''):
+        self.checks = list(checks)
+        self.source = source
+        self.rows = 0
+        self.seconds = [0.0] * len(self.checks)
+        self.started = time.perf_counter()
+
+    @property
+    def columns(self):
+        """Return the columns read by any check"""
+        return list(dict.fromkeys(column for check in self.checks for column in check.columns))
+
+    @property
+    def failing(self):
+        """Return True if any check has failed on the chunks seen so far"""
+        return any(check.failures for check in self.checks)
+
+    def update(self, chunk):
+        """Feed the next chunk to every check"""
+        if 'date' in chunk.columns and not pd.api.types.is_datetime64_any_dtype(chunk['date'].dtype):
+            # Malformed dates become NaT, which NotNull reports
+            chunk = chunk.assign(date=pd.to_datetime(chunk['date'], errors='coerce'))
+        for i, check in enumerate(self.checks):
+            start = time.perf_counter()
+            check.update(chunk, self.rows)
+            self.seconds[i] += time.perf_counter() - start
+        self.rows += len(chunk)
+
+    def finish(self):
+        """Return the ValidationReport of every chunk seen"""
+        results = []
+        for check, seconds in zip(self.checks, self.seconds):
+            start = time.perf_counter()
+            detail, stats = check.finish(self.rows)
+            seconds += time.perf_counter() - start
+            results.append(CheckResult(check.name, check.failures == 0, check.failures, detail,
+                                       list(check.examples), stats, seconds))
+        return ValidationReport(self.source, self.rows, time.perf_counter() - self.started, results)
+
+@traced()
+def validate(path, checks=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Run checks over a CSV file, Parquet dataset or column store in one pass
+
+    Only the columns the checks declare (and the source has) are read;
+    a missing column is reported by the Schema check rather than raised.
+    """
+    validator = Validator(checks if checks is not None else default_checks(), str(path))
+    available = set(sales_columns(path))
+    columns = [column for column in validator.columns if column in available]
+    for chunk in iter_sales(path, columns, chunk_size, date_errors='coerce'):
+        validator.update(chunk)
+    return validator.finish()
+
+def print_report(report, indent=''):
+    """Print one line per check and the pass throughput"""
+    for result in report.results:
+        status = '✅' if result.passed else '❌'
+        print(f"{indent}{status} {result.name}: {result.detail}")
+        if result.examples:
+            print(f"{indent}   first failing rows: {', '.join(map(str, result.examples))}")
+    print(f"{indent}⏱️  Validated {report.rows:,} rows in {report.seconds:.2f}s "
+          f"({report.rows_per_sec:,.0f} rows/sec)")
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Validate cleaned sales data in one streaming pass')
+    parser.add_argument('--input', default='data/clean_sales_data.csv',
+                        help='Cleaned data: a CSV file, .parquet dataset or .columns store')
+    parser.add_argument('--database', default=None,
+                        help='SQLite database whose sales table must have the same row count')
+    parser.add_argument('--start', default=None, help='Earliest allowed date (YYYY-MM-DD)')
+    parser.add_argument('--end', default=None, help='Latest allowed date (YYYY-MM-DD)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Rows per chunk')
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = validate(args.input, default_checks(args.database, args.start, args.end), args.chunk_size)
+    print_report(report)
+    sys.exit(0 if report.passed else 1)
@@ -0,0 +1,20 @@
+import os
+import pytest
+from benchmark_pipeline import dataset_paths, run_clean, run_dashboard, run_generate
+
+@pytest.fixture(scope='module')
+def paths(tmp_path_factory):
+    """A small generated and cleaned dataset"""
+    paths = dataset_paths(str(tmp_path_factory.mktemp('benchmark')), 1_000, 'csv')
+    os.makedirs(paths['dir'])
+    run_generate(paths, 1_000, 'csv', 1)
+    run_clean(paths, 1_000, 'csv', 1)
+    return paths
+
+def test_dashboard_stage_builds_every_chart(paths):
+    steps = run_dashboard(paths, 1_000, 'csv', 1)
+    names = [step['step'] for step in steps]
+    assert 'top_performers' in names
+    assert 'create_top_performers_chart' in names
+    assert 'create_comprehensive_dashboard' in names
+    assert all(step['seconds'] >= 0 for step in steps)
@@ -0,0 +1,136 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+import pytest
+from clean_data import clean_chunk
+from generate_data import generate_sales_chunks
+from load_to_sql import CUBE_TABLE, STATE_TABLE, bulk_load, load_incremental
+from storage import RAW_SCHEMA, write_parquet
+from topk_index import TOPK_TABLE
+
+# Rows in the first ingest; the rest are appended before the second
+INITIAL_ROWS = 2_000
+
+@pytest.fixture(scope='module')
+def raw():
+    """Raw sales in date order, so appended rows are never older than the watermark"""
+    df = next(generate_sales_chunks(3_000, seed=11))
+    return df.sort_values('date', kind='stable', ignore_index=True)
+
+def write_csv(df, path, append=False):
+    df.to_csv(path, mode='a' if append else 'w', header=not append, index=False, date_format='%Y-%m-%d')
+
+def summary(database_path):
+    """Row count, sales total and the cube and top-K tables of a database"""
+    conn = sqlite3.connect(database_path)
+    try:
+        count, total = conn.execute("SELECT COUNT(*), SUM(total_sales) FROM sales").fetchone()
+        cube = pd.read_sql_query(
+            f"SELECT date, product, region, salesperson, SUM(total_sales) AS total_sales, "
+            f"SUM(quantity) AS quantity, SUM(row_count) AS row_count FROM {CUBE_TABLE} "
+            "GROUP BY date, product, region, salesperson ORDER BY date, product, region, salesperson", conn
+        )
+        topk = pd.read_sql_query(
+            f"SELECT dimension, bucket, key, SUM(total_sales) AS total_sales FROM {TOPK_TABLE} "
+            "GROUP BY dimension, bucket, key ORDER BY dimension, bucket, key", conn
+        )
+    finally:
+        conn.close()
+    return count, total, cube, topk
+
+def assert_same_tables(database_path, expected_path):
+    count, total, cube, topk = summary(database_path)
+    expected_count, expected_total, expected_cube, expected_topk = summary(expected_path)
+    assert count == expected_count
+    assert total == pytest.approx(expected_total)
+    for result, expected in [(cube, expected_cube), (topk, expected_topk)]:
+        keys = [col for col in expected.columns if col not in ('total_sales', 'quantity', 'row_count')]
+        pd.testing.assert_frame_equal(result[keys], expected[keys])
+        np.testing.assert_allclose(result['total_sales'], expected['total_sales'], rtol=1e-9)
+    assert cube['quantity'].tolist() == expected_cube['quantity'].tolist()
+    assert cube['row_count'].tolist() == expected_cube['row_count'].tolist()
+
+def bulk_loaded(df, directory):
+    """Database built by a full bulk_load of the cleaned rows"""
+    clean_path = directory / 'clean.csv'
+    clean_chunk(df.drop_duplicates()).to_csv(clean_path, index=False, date_format='%Y-%m-%d')
+    database_path = str(directory / 'bulk.db')
+    bulk_load(str(clean_path), database_path)
+    return database_path
+
+def test_csv_append_matches_bulk_load(raw, tmp_path):
+    raw_path = tmp_path / 'sales.csv'
+    database_path = str(tmp_path / 'sales.db')
+    write_csv(raw.iloc[:INITIAL_ROWS], raw_path)
+    assert load_incremental(str(raw_path), database_path) == INITIAL_ROWS
+
+    write_csv(raw.iloc[INITIAL_ROWS:], raw_path, append=True)
+    assert load_incremental(str(raw_path), database_path) == len(raw) - INITIAL_ROWS
+    assert load_incremental(str(raw_path), database_path) == 0
+
+    assert_same_tables(database_path, bulk_loaded(raw, tmp_path))
+    conn = sqlite3.connect(database_path)
+    byte_offset, rows_ingested = conn.execute(f"SELECT byte_offset, rows_ingested FROM {STATE_TABLE}").fetchone()
+    conn.close()
+    assert byte_offset == raw_path.stat().st_size
+    assert rows_ingested == len(raw)
+
+def test_csv_partial_last_line_waits_for_newline(raw, tmp_path):
+    raw_path = tmp_path / 'sales.csv'
+    database_path = str(tmp_path / 'sales.db')
+    write_csv(raw.iloc[:INITIAL_ROWS], raw_path)
+    line = raw.iloc[INITIAL_ROWS:INITIAL_ROWS + 1].to_csv(header=False, index=False, date_format='%Y-%m-%d')
+    with open(raw_path, 'a') as f:
+        f.write(line[:-5])
+    assert load_incremental(str(raw_path), database_path) == INITIAL_ROWS
+
+    with open(raw_path, 'a') as f:
+        f.write(line[-5:])
+    assert load_incremental(str(raw_path), database_path) == 1
+
+def test_parquet_append_matches_bulk_load(raw, tmp_path):
+    raw_path = str(tmp_path / 'sales.parquet')
+    database_path = str(tmp_path / 'sales.db')
+    # The second batch starts on the watermark day, which is re-read and deduplicated
+    day = raw['date'] == raw['date'].iloc[INITIAL_ROWS]
+    split = int(day.idxmax()) + max(int(day.sum()) // 2, 1)
+    write_parquet(raw.iloc[:split], raw_path, RAW_SCHEMA)
+    assert load_incremental(raw_path, database_path) == split
+
+    write_parquet(raw.iloc[split:], raw_path, RAW_SCHEMA, basename_template='part-append-{i}.parquet',
+                  overwrite=False)
+    assert load_incremental(raw_path, database_path) == len(raw) - split
+    assert load_incremental(raw_path, database_path) == 0
+
+    assert_same_tables(database_path, bulk_loaded(raw, tmp_path))
+    conn = sqlite3.connect(database_path)
+    max_date = conn.execute(f"SELECT max_date FROM {STATE_TABLE}").fetchone()[0]
+    conn.close()
+    assert max_date == raw['date'].max().strftime('%Y-%m-%d')
+
+def test_rewritten_csv_prefix_is_reloaded(raw, tmp_path, capsys):
+    raw_path = tmp_path / 'sales.csv'
+    database_path = str(tmp_path / 'sales.db')
+    write_csv(raw.iloc[:INITIAL_ROWS], raw_path)
+    assert load_incremental(str(raw_path), database_path) == INITIAL_ROWS
+
+    # Same length and line breaks, so only the prefix digest shows the rewrite
+    rewritten = raw.copy()
+    rewritten.loc[0, 'product'] = 'Product B' if raw.loc[0, 'product'] == 'Product A' else 'Product A'
+    original = raw_path.read_bytes()
+    write_csv(rewritten.iloc[:INITIAL_ROWS], raw_path)
+    assert raw_path.stat().st_size == len(original) and raw_path.read_bytes() != original
+    write_csv(rewritten.iloc[INITIAL_ROWS:], raw_path, append=True)
+
+    # Every row is rescanned: the changed row and the appended rows are new,
+    # the unchanged rows are dropped as already ingested
+    assert load_incremental(str(raw_path), database_path) == 1 + len(raw) - INITIAL_ROWS
+    assert 'rescanning' in capsys.readouterr().out
+    conn = sqlite3.connect(database_path)
+    count = conn.execute(
+        "SELECT COUNT(*) FROM sales WHERE date = ? AND product = ? AND unit_price = ? AND quantity = ?",
+        (rewritten.loc[0, 'date'].strftime('%Y-%m-%d'), rewritten.loc[0, 'product'],
+         float(rewritten.loc[0, 'unit_price']), int(rewritten.loc[0, 'quantity']))
+    ).fetchone()[0]
+    conn.close()
+    assert count == 1
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+from load_to_sql import bulk_load
+from query_backend import DataFrameBackend, SQLiteBackend
+from topk_index import TopKIndex
+
+FILTERS = [
+    {},
+    {'years': [2023]},
+    {'years': [2022, 2023]},
+    {'date_range': (pd.Timestamp('2022-03-01').date(), pd.Timestamp('2023-02-28').date())},
+]
+
+@pytest.fixture(scope='module')
+def sales():
+    """Sales with refunds, so many monthly totals are negative"""
+    rng = np.random.default_rng(7)
+    n = 20_000
+    dates = pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 3 * 365, n), 'D')
+    quantity = rng.integers(1, 20, n)
+    unit_price = np.round(rng.uniform(-500, 1000, n), 2)
+    return pd.DataFrame({
+        'date': dates,
+        'product': rng.choice([f'Product {c}' for c in 'ABCDE'], n),
+        'region': rng.choice(['North', 'South', 'East', 'West', 'Central'], n),
+        'salesperson': [f'Seller {i}' for i in rng.integers(0, 400, n)],
+        'quantity': quantity,
+        'unit_price': unit_price,
+        'total_sales': quantity * unit_price,
+        'month': dates.month,
+        'year': dates.year,
+        'quarter': dates.quarter,
+    })
+
+def brute_force(df, dimension, filters, k):
+    """Top-k by a full group-by of the filtered rows"""
+    mask = np.ones(len(df), dtype=bool)
+    if filters.get('years'):
+        mask &= df['year'].isin(filters['years']).to_numpy()
+    if filters.get('date_range'):
+        start, end = (pd.Timestamp(b) for b in filters['date_range'])
+        mask &= ((df['date'] >= start) & (df['date'] <= end)).to_numpy()
+    totals = df[mask].groupby(dimension)['total_sales'].sum()
+    return totals.sort_values(ascending=False).head(k)
+
+def assert_matches(result, expected, dimension):
+    assert result is not None
+    assert result[dimension].astype(str).tolist() == expected.index.astype(str).tolist()
+    np.testing.assert_allclose(result['total_sales'].to_numpy(), expected.to_numpy(), rtol=1e-9, atol=1e-6)
+
+def test_monthly_totals_include_negatives(sales):
+    monthly = sales.groupby(['year', 'month', 'salesperson'])['total_sales'].sum()
+    assert (monthly < 0).any()
+
+@pytest.mark.parametrize('filters', FILTERS)
+@pytest.mark.parametrize('dimension', ['salesperson', 'product', 'region'])
+@pytest.mark.parametrize('k', [1, 10, 1000])
+def test_in_memory_top_matches_group_by(sales, filters, dimension, k):
+    backend = DataFrameBackend(sales, topk=TopKIndex(sales))
+    assert_matches(backend.top(dimension, filters, k), brute_force(sales, dimension, filters, k), dimension)
+
+@pytest.fixture(scope='module')
+def database(sales, tmp_path_factory):
+    directory = tmp_path_factory.mktemp('topk')
+    csv_path = directory / 'clean.csv'
+    sales.assign(date=sales['date'].dt.strftime('%Y-%m-%d')).to_csv(csv_path, index=False)
+    database_path = str(directory / 'sales.db')
+    bulk_load(str(csv_path), database_path)
+    return database_path
+
+@pytest.mark.parametrize('filters', FILTERS)
+@pytest.mark.parametrize('dimension', ['salesperson', 'product', 'region'])
+@pytest.mark.parametrize('k', [1, 10, 1000])
+def test_sqlite_top_matches_group_by(sales, database, filters, dimension, k):
+    backend = SQLiteBackend(database)
+    assert_matches(backend.top(dimension, filters, k), brute_force(sales, dimension, filters, k), dimension)
+
+def test_partial_month_falls_back(sales, database):
+    filters = {'date_range': (pd.Timestamp('2022-03-05').date(), pd.Timestamp('2022-06-30').date())}
+    assert DataFrameBackend(sales, topk=TopKIndex(sales)).top('salesperson', filters, 5) is None
+    assert SQLiteBackend(database).top('salesperson', filters, 5) is None